@@ -1,4 +1,3 @@
-from cookies_site_utils.article_helper import ArticleHelper
 from pathlib import Path
 import subprocess
 import argparse
@@ -55,12 +54,81 @@ def main():
         '-c', '--article_helper_conf_path',
         type=str, default='.helper.toml',
     )
+    subparsers = parser.add_subparsers(dest='command')
+    parser_lint = subparsers.add_parser('lint', help='サイトの全ページを検証します')
+    parser_lint.add_argument('site_root', type=str, nargs='?', default='docs')
+    parser_lint.add_argument('-n', '--subsite_name', type=str, default=None)
+    parser_lint.add_argument('-r', '--relaxed', action='store_true')
+    parser_lint.add_argument('-j', '--jobs', type=int, default=None)
+    parser_lint.add_argument(
+        '-f', '--format', choices=['text', 'json'], default='text',
+    )
+    parser_dupes = subparsers.add_parser('dupes', help='ほぼ重複している記事を探します')
+    parser_dupes.add_argument('site_root', type=str, nargs='?', default='docs')
+    parser_dupes.add_argument('-t', '--threshold', type=float, default=0.5)
+    parser_dupes.add_argument(
+        '-c', '--cache_path', type=str, default='.dupes_cache.json',
+    )
+    parser_dupes.add_argument(
+        '-f', '--format', choices=['text', 'json'], default='text',
+    )
+    parser_memdiff = subparsers.add_parser(
+        'memdiff', help='2 つのメモリレポートのステージごとのピークを比べます',
+    )
+    parser_memdiff.add_argument('old_report', type=str)
+    parser_memdiff.add_argument('new_report', type=str)
+    parser_memdiff.add_argument('-t', '--tolerance', type=float, default=0.1)
+    parser_worker = subparsers.add_parser(
+        'worker', help='記事編集補助機能を常駐させます (csu -a が自動で使います)',
+    )
+    parser_worker.add_argument('-S', '--socket', type=str, default=None)
+    parser_worker.add_argument('--stop', action='store_true')
+    parser_serve = subparsers.add_parser('serve', help='サイトをローカルで配信します')
+    parser_serve.add_argument('site_root', type=str, nargs='?', default='docs')
+    parser_serve.add_argument('-b', '--bind', type=str, default='127.0.0.1')
+    parser_serve.add_argument('-p', '--port', type=int, default=8000)
+    parser_serve.add_argument('-j', '--jobs', type=int, default=16)
     args = parser.parse_args()
 
     if args.sync_hash:
         _sync_hash()
+    # 重い依存 (bs4, jinja2, toml 等) は必要なときにだけインポートする
     if args.article_helper:
-        ArticleHelper.run(args.article_helper_conf_path)
+        from cookies_site_utils.worker import run_in_worker
+        if not run_in_worker(args.article_helper_conf_path):  # ワーカーがなければ直接実行
+            from cookies_site_utils.article_helper import ArticleHelper
+            ArticleHelper.run(args.article_helper_conf_path)
+    if args.command == 'dupes':
+        from cookies_site_utils.dupes import find_dupes, format_dupes
+        site_root = Path(args.site_root)
+        paths = sorted(site_root.glob('**/articles/*.html'))
+        dupes = find_dupes(paths, args.threshold, args.cache_path)
+        print(format_dupes(dupes, site_root, args.format))
+    if args.command == 'memdiff':
+        from cookies_site_utils.memprof import compare_reports, format_comparison
+        import json
+        old = json.loads(Path(args.old_report).read_text(encoding='utf8'))
+        new = json.loads(Path(args.new_report).read_text(encoding='utf8'))
+        print(format_comparison(old, new, args.tolerance))
+        if compare_reports(old, new, args.tolerance):
+            raise SystemExit(1)
+    if args.command == 'worker':
+        from cookies_site_utils.worker import serve_worker, stop_worker
+        if args.stop:
+            stop_worker(args.socket)
+        else:
+            serve_worker(args.socket)
+    if args.command == 'lint':
+        from cookies_site_utils.lint import lint_site, format_results
+        results = lint_site(
+            args.site_root, args.subsite_name, not args.relaxed, args.jobs,
+        )
+        print(format_results(results, args.format))
+        if any(r['errors'] for r in results):
+            raise SystemExit(1)
+    if args.command == 'serve':
+        from cookies_site_utils.server import serve
+        serve(args.site_root, args.bind, args.port, args.jobs)
 
 
 if __name__ == '__main__':
@@ -1,21 +1,95 @@
 from cookies_site_utils.builder import ArticlePage
 import cookies_site_utils.soup_util as su
+from cookies_site_utils.bib_util import iter_references
+from cookies_site_utils.category_index import CategoryIndex
+from cookies_site_utils.worker import run_commands, job_commands
+from cookies_site_utils.core import File
+import cookies_site_utils.memprof as memprof
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from collections import OrderedDict
+import bs4
+import copy
+import json
 import toml
 import os
-import subprocess
 import logging
 logger = logging.getLogger(__name__)
 
 
+class DocumentCache:
+    """
+    パース済みの記事を (path, mtime, size) をキーに保持する LRU キャッシュです
+    - 取り出した soup はコピーなので自由に編集できます
+    - コピーは木全体の複製でパースの 8 割ほどかかるので、編集しないときは
+      copy_soup=False で共有の soup を受け取ってください (読むだけにすること)
+    - 保持する量は推定メモリ (テキスト長 x bytes_per_char) で max_bytes までとします
+    """
+    bytes_per_char = 10
+    default_max_bytes = 64 * 1024 * 1024
+
+    def __init__(self, max_bytes=default_max_bytes):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.entries = OrderedDict()  # path -> (mtime, size), soup, text
+
+    @staticmethod
+    def _path(path):
+        return Path(os.path.abspath(path))
+
+    def get(self, path, parse, copy_soup=True):
+        """
+        キャッシュになければ parse() でパースして保持します
+        copy_soup=False のときはキャッシュの soup そのものを返すので編集しないでください
+        """
+        path = DocumentCache._path(path)
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == key:
+            self.entries.move_to_end(path)
+            soup, text = entry[1], entry[2]
+        else:
+            self.invalidate(path)
+            soup, text = parse()
+            self.entries[path] = (key, soup, text)
+            self.n_bytes += len(text) * DocumentCache.bytes_per_char
+            while self.n_bytes > self.max_bytes and len(self.entries) > 1:
+                self._pop(next(iter(self.entries)))
+        if copy_soup:
+            soup = copy.copy(soup)
+        return soup, text
+
+    def _pop(self, path):
+        _, _, text = self.entries.pop(path)
+        self.n_bytes -= len(text) * DocumentCache.bytes_per_char
+
+    def invalidate(self, path):
+        path = DocumentCache._path(path)
+        if path in self.entries:
+            self._pop(path)
+
+
 class ArticlePageEx(ArticlePage):
+    def parse(self, data=None, copy_soup=True):
+        if data is not None or ArticleHelper.doc_cache is None:
+            return super().parse(data)
+        return ArticleHelper.doc_cache.get(
+            self.path, lambda: ArticlePage.parse(self), copy_soup,
+        )
+
     def generate_from_soup(self, soup):
-        self.write_text(su.decode_soup(soup))
+        text = su.decode_soup(soup)
+        self.write_text(text)
+        if ArticleHelper.doc_cache is not None:
+            ArticleHelper.doc_cache.invalidate(self.path)
         self.eval()
+        return text
 
     def copy_soup(self, new_title, new_subsite_name_=None):
         soup, text = self.parse()
         new_subsite_name = new_subsite_name_ or self.subsite_name
+        su.clear_prerendered(soup)  # 小見出し一覧はコピー先で描画し直す
         su.set_title(soup, new_title, new_subsite_name)
         su.clear_item(soup)
         return soup
@@ -24,10 +98,65 @@ class ArticlePageEx(ArticlePage):
         super().__init__(path, subsite_name, strict_check)
 
 
+RENAME_JOB_TYPES = ('RENAME_CATEGORY', 'MERGE_CATEGORIES')
+
+
+class SoupifyManifest:
+    """
+    SOUPIFY で最後に書き出した内容のダイジェストです
+    今の内容のダイジェストが一致する記事は整形済みなのでパースせずに飛ばします
+    整形処理 (soup_util, bs4) が変わったらすべて整形し直します
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = Path(manifest_path)
+        self.version = File.digest(
+            Path(su.__file__).read_bytes() + bs4.__version__.encode('utf8')
+        )
+        self.digests = {}  # 絶対パス -> ダイジェスト
+        if self.manifest_path.is_file():
+            manifest = json.loads(self.manifest_path.read_text(encoding='utf8'))
+            if manifest.get('version') == self.version:
+                self.digests = manifest['digests']
+
+    @staticmethod
+    def _key(path):
+        return Path(os.path.abspath(path)).as_posix()
+
+    def is_normalized(self, path):
+        digest = self.digests.get(SoupifyManifest._key(path))
+        return digest == File.digest(Path(path).read_bytes())
+
+    def record(self, path, text):
+        self.digests[SoupifyManifest._key(path)] = File.digest(text.encode('utf8'))
+
+    def dump(self):
+        self.manifest_path.write_text(json.dumps(
+            {'version': self.version, 'digests': self.digests},
+            ensure_ascii=False, sort_keys=True,
+        ) + '\n', encoding='utf8', newline='\n')
+
+
+def _soupify(path, subsite_name, strict_check):
+    """
+    1 記事を整形して書き出した内容を返します (プロセスプール用)
+    """
+    ape = ArticlePageEx(path, subsite_name, strict_check)
+    soup, _ = ape.parse()
+    return ape.generate_from_soup(soup)
+
+
+def _old_category_paths(job):
+    if job['job_type'] == 'RENAME_CATEGORY':
+        return [job['path']]
+    return job['paths']
+
+
 class ArticleHelper:
     subsite_name = None
     templates = {}
     relaxed_list = []
+    doc_cache = DocumentCache()
+    conf_cache = {}  # 設定ファイルの絶対パス -> ((mtime, size), 設定)
 
     @classmethod
     def run_job_group(cls, path, jobs):
@@ -78,6 +207,31 @@ class ArticleHelper:
                     soup, _ = ape.parse()
                 su.add_references_with_key(soup, job['references'])
 
+            if job['job_type'] == 'IMPORT_REFERENCES':
+                if soup is None:
+                    soup, _ = ape.parse()
+                refs = iter_references(job['source'])
+                if soup.find('ol', class_='ref') is not None:
+                    su.add_references(soup, (
+                        {'title': ref['title'], 'url': ref['urls'][0]}
+                        if ref['urls'] else {'title': ref['title']}
+                        for ref in refs
+                    ))
+                else:
+                    su.add_references_with_key(soup, refs)
+
+            if job['job_type'] in RENAME_JOB_TYPES:
+                if soup is None:
+                    soup, _ = ape.parse()
+                su.rename_categories(
+                    soup, _old_category_paths(job), job['new_path'], job['new_name'],
+                )
+
+            if job['job_type'] == 'PRERENDER_SIDEBAR':
+                if soup is None:
+                    soup, _ = ape.parse()
+                su.prerender_sidebar(soup)
+
             if job['job_type'] == 'UPDATE_TIMESTAMP':
                 if soup is None:
                     soup, _ = ape.parse()
@@ -96,34 +250,153 @@ class ArticleHelper:
         return ape, soup
 
     @classmethod
-    def run(cls, conf_path):
-        conf = toml.loads(Path(conf_path).read_text(encoding='utf8'))
+    def load_conf(cls, conf_path):
+        """
+        設定をロードします (ワーカーでは変わっていなければパース済みのものを使います)
+        """
+        path = Path(os.path.abspath(conf_path))
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = cls.conf_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        conf = toml.loads(path.read_text(encoding='utf8'))
+        cls.conf_cache[path] = (key, conf)
+        return conf
+
+    @classmethod
+    def run_jobs(cls, conf_path):
+        """
+        ジョブを実行し、後で実行するコマンド [(終了を待つか, コマンド), ...] を返します
+        """
+        conf = cls.load_conf(conf_path)
+        return job_commands(conf, cls.edit_articles(conf_path))
+
+    @classmethod
+    def edit_articles(cls, conf_path):
+        """
+        ジョブを実行し、最後に編集した記事の絶対パスを返します (なければ None)
+        """
+        conf_path = Path(conf_path).resolve()  # working_dir に移る前に
+        conf = cls.load_conf(conf_path)
         if 'working_dir' in conf:
             os.chdir(Path(conf['working_dir']).expanduser())
             logger.info('Switched to directory: ' + conf['working_dir'])
-        if 'subsite_name' in conf:
-            cls.subsite_name = conf['subsite_name']
-        if 'templates' in conf:
-            for template, parent in conf['templates'].items():
-                cls.templates[Path(template)] = Path(parent).resolve()
-        if 'relaxed_list' in conf:
-            cls.relaxed_list = [Path(p) for p in conf['relaxed_list']]
+        cls.subsite_name = conf.get('subsite_name')
+        cls.templates = {}
+        for template, parent in conf.get('templates', {}).items():
+            cls.templates[Path(template)] = Path(parent).resolve()
+        cls.relaxed_list = [Path(p) for p in conf.get('relaxed_list', [])]
+        max_bytes = conf.get('doc_cache_max_bytes', DocumentCache.default_max_bytes)
+        if cls.doc_cache.max_bytes != max_bytes:
+            cls.doc_cache = DocumentCache(max_bytes)
 
-        soup = None
-        for job_group in conf['job_groups']:
+        profile = memprof.start(conf.get('memory_report_path', ''))
+        try:
+            edited = cls._run_job_groups(conf_path, conf)
+        finally:
+            if profile is not None:
+                profile.finish()
+        return None if edited is None else edited.resolve()
+
+    @classmethod
+    def _run_job_groups(cls, conf_path, conf):
+        """
+        ジョブグループを順に実行し、最後に編集した記事を返します
+        """
+        edited = None
+        for i_group, job_group in enumerate(conf['job_groups']):
             if job_group.get('skip', False):
                 continue
+            paths = []
             for path_raw in job_group['paths']:
                 path = Path(path_raw)
                 if '*' in path.name:
-                    for path in path.parent.glob(path.name):
-                        ape, soup = cls.run_job_group(path, job_group['jobs'])
+                    paths += sorted(path.parent.glob(path.name))
                 else:
+                    paths.append(path)
+            renames = [
+                job for job in job_group['jobs']
+                if job['job_type'] in RENAME_JOB_TYPES and not job.get('skip', False)
+            ]
+            for job in renames:
+                if job['job_type'] == 'RENAME_CATEGORY':
+                    job.setdefault('new_path', job['path'])  # 名前のみ変える
+            if renames:  # 付け替えるカテゴリにリンクしている記事のみ開く
+                index = CategoryIndex(conf.get(
+                    'category_index_path', '.category_index.json',
+                ))
+                old_paths = {p for job in renames for p in _old_category_paths(job)}
+                cat_dirs = {(path.parent.parent / 'categories') for path in paths}
+                # 付け替え先に既にリンクしている記事も名前を揃えるために開く
+                new_paths = {job['new_path'] for job in renames}
+                paths = index.articles_of(paths, old_paths | new_paths)
+            job_types = {
+                job['job_type'] for job in job_group['jobs'] if not job.get('skip', False)
+            }
+            if job_types == {'SOUPIFY'}:  # 整形のみなら整形済みの記事を飛ばして並列に
+                manifest_path = Path(conf_path).parent / '.soupify_manifest.json'
+                done = cls.soupify_all(paths, manifest_path, conf.get('soupify_jobs'))
+                edited = done[-1] if done else edited
+            else:
+                for path in paths:
                     ape, soup = cls.run_job_group(path, job_group['jobs'])
+                    if soup is not None:
+                        edited = ape.path
+            if renames:
+                index.dump()
+                for job in renames:
+                    cls.retire_category_pages(job, cat_dirs)
+            memprof.stage(f'job_group/{i_group}')
+        return edited
 
-        if soup is not None:
-            subprocess.run(['git', 'status'])
-            if 'text_editor' in conf:
-                subprocess.Popen([conf['text_editor'], ape.path.resolve()])
-            if 'web_browser' in conf:
-                subprocess.Popen([conf['web_browser'], ape.path.resolve()])
+    @classmethod
+    def soupify_all(cls, paths, manifest_path, jobs=None):
+        """
+        整形済みでない記事のみプロセスプールで整形し、整形した記事を返します
+        jobs=1 のときはプロセスプールを使いません
+        """
+        manifest = SoupifyManifest(manifest_path)
+        todo = [path for path in paths if not manifest.is_normalized(path)]
+        logger.info(f'SOUPIFY {len(todo)} 件 (整形済み {len(paths) - len(todo)} 件)')
+        args = (
+            todo,
+            [cls.subsite_name] * len(todo),
+            [path not in cls.relaxed_list for path in todo],
+        )
+        try:
+            if jobs == 1 or len(todo) <= 1:
+                for path, text in zip(todo, map(_soupify, *args)):
+                    manifest.record(path, text)
+            else:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    for path, text in zip(
+                        todo, executor.map(_soupify, *args, chunksize=8),
+                    ):
+                        manifest.record(path, text)
+        finally:  # 途中で失敗してもそれまでの記録は残す
+            manifest.dump()
+        return todo
+
+    @staticmethod
+    def retire_category_pages(job, cat_dirs):
+        """
+        付け替え元のカテゴリページを削除するか付け替え先へのリダイレクトにします
+        """
+        for cat_dir in cat_dirs:
+            for old_path in _old_category_paths(job):
+                if old_path == job['new_path']:
+                    continue
+                page = File(cat_dir / f'{old_path}.html')
+                if not page.exists():
+                    continue
+                if job.get('redirect', False):
+                    logger.info(f'リダイレクト {page.rel_path}')
+                    page.write_text(su.redirect_html(f'{job["new_path"]}.html'))
+                else:
+                    logger.info(f'削除 {page.rel_path}')
+                    page.unlink()
+
+    @classmethod
+    def run(cls, conf_path):
+        run_commands(cls.run_jobs(conf_path))
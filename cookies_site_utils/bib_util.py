@@ -0,0 +1,169 @@
+from pathlib import Path
+import csv
+import html
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _chars(f):
+    for line in f:
+        yield from line
+
+
+def _read_until(chars, stops):
+    s = ''
+    for c in chars:
+        if c in stops:
+            return s, c
+        s += c
+    return s, None
+
+
+def _read_braced(chars, opener='{', closer='}'):
+    """
+    開き括弧の直後から対応する閉じ括弧までを読みます (閉じ括弧は含みません)
+    """
+    s = ''
+    depth = 1
+    for c in chars:
+        if c == opener:
+            depth += 1
+        elif c == closer:
+            depth -= 1
+            if depth == 0:
+                return s
+        s += c
+    return s
+
+
+def _read_quoted(chars):
+    s = ''
+    depth = 0
+    for c in chars:
+        if c == '"' and depth == 0:
+            return s
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        s += c
+    return s
+
+
+def _read_fields(chars, closer='}'):
+    """
+    エントリ本体 (キーの後) のフィールドを読み、エントリの閉じ括弧 closer で止まります
+    """
+    fields = {}
+    stops = ',' + closer
+    while True:
+        name, stop = _read_until(chars, '=' + closer)
+        if stop != '=':
+            return fields
+        name = name.strip(' \t\r\n,').lower()
+        value = ''
+        for c in chars:
+            if c.isspace():
+                continue
+            if c == '{':
+                value = _read_braced(chars)
+                _, stop = _read_until(chars, stops)
+            elif c == '"':
+                value = _read_quoted(chars)
+                _, stop = _read_until(chars, stops)
+            else:  # 数値などの括弧なしの値
+                rest, stop = _read_until(chars, stops)
+                value = (c + rest).strip()
+            break
+        fields[name] = value
+        if stop != ',':
+            return fields
+
+
+def iter_bibtex(f):
+    """
+    BibTeX のエントリを (種別, キー, フィールド) として 1 件ずつ読みます
+    """
+    chars = _chars(f)
+    while True:
+        _, stop = _read_until(chars, '@')
+        if stop is None:
+            return
+        entry_type, opener = _read_until(chars, '{(')
+        if opener is None:
+            return
+        closer = '}' if opener == '{' else ')'  # @type(...) の形も読む
+        entry_type = entry_type.strip().lower()
+        if entry_type in ('comment', 'preamble', 'string'):
+            _read_braced(chars, opener, closer)
+            continue
+        key, stop = _read_until(chars, ',' + closer)
+        fields = _read_fields(chars, closer) if stop == ',' else {}
+        yield entry_type, key.strip(), fields
+
+
+def _clean(value):
+    return re.sub(r'\s+', ' ', value.replace('{', '').replace('}', '')).strip()
+
+
+def bibtex_to_reference(key, fields):
+    parts = []
+    for name in ['author', 'title']:
+        if name in fields:
+            parts.append(_clean(fields[name]) + '.')
+    venue = [
+        _clean(fields[name]) for name in ['journal', 'booktitle', 'publisher']
+        if name in fields
+    ][:1]
+    if 'year' in fields:
+        venue.append(_clean(fields['year']))
+    if venue:
+        parts.append(', '.join(venue) + '.')
+    urls = _clean(fields.get('url', '')).split()
+    if 'doi' in fields:
+        doi_url = 'https://doi.org/' + _clean(fields['doi'])
+        if doi_url not in urls:
+            urls.append(doi_url)
+    return {'key': key, 'title': html.escape(' '.join(parts), quote=False), 'urls': urls}
+
+
+def iter_csv(f):
+    """
+    key, title, url (または urls) 列をもつ CSV を読みます
+    urls 列は空白区切りで複数の URL を書けます
+    """
+    for row in csv.DictReader(f):
+        urls = (row.get('urls') or row.get('url') or '').split()
+        yield {'key': (row.get('key') or '').strip(), 'title': row['title'], 'urls': urls}
+
+
+def iter_references(path):
+    """
+    BibTeX (.bib) または CSV (.csv) から参考文献を 1 件ずつ読みます
+    読みながらキーまたは URL が既出の参考文献を除きます
+    """
+    path = Path(path)
+    seen_keys = set()
+    seen_urls = set()
+    with open(path, encoding='utf8', newline='') as f:
+        if path.suffix == '.bib':
+            refs = (
+                bibtex_to_reference(key, fields)
+                for _, key, fields in iter_bibtex(f)
+            )
+        elif path.suffix == '.csv':
+            refs = iter_csv(f)
+        else:
+            raise ValueError(f'Unsupported reference file: {path}')
+        for ref in refs:
+            if ref['key'] in seen_keys:
+                logger.info(f'Duplicated key: {ref["key"]}')
+                continue
+            if any(url in seen_urls for url in ref['urls']):
+                logger.info(f'Duplicated url: {ref["urls"]}')
+                continue
+            if ref['key']:
+                seen_keys.add(ref['key'])
+            seen_urls.update(ref['urls'])
+            yield ref
@@ -0,0 +1,113 @@
+from cookies_site_utils.core import File
+from bs4 import BeautifulSoup
+from pathlib import PurePosixPath, Path
+import posixpath
+import fnmatch
+import gzip
+import json
+import logging
+logger = logging.getLogger(__name__)
+
+METRICS = ('bytes', 'gzip_bytes', 'asset_bytes')
+_REFS = (('link', 'href'), ('script', 'src'), ('img', 'src'), ('source', 'src'))
+
+
+def local_refs(data):
+    """
+    ページが参照するローカルの CSS, JS, 画像のパスを返します (ページからの相対パス)
+    """
+    soup = BeautifulSoup(File.decode(data), 'html.parser')
+    refs = []
+    for tag_name, attr in _REFS:
+        for tag in soup.find_all(tag_name):
+            if tag_name == 'link' and not (
+                {'stylesheet', 'preload', 'icon'} & set(tag.get('rel', []))
+            ):
+                continue
+            ref = tag.get(attr, '').split('#')[0].split('?')[0]
+            if not ref or ref.startswith(('/', 'data:')) or ':' in ref.split('/')[0]:
+                continue
+            if ref not in refs:
+                refs.append(ref)
+    return refs
+
+
+class PageBudget:
+    """
+    find_disallowed の走査中にページの重さ (HTML のバイト数・gzip 後のバイト数・
+    参照するローカルの CSS, JS, 画像の合計バイト数) を測り、予算と比べます
+    budgets は {glob: {'bytes': n, 'gzip_bytes': n, 'asset_bytes': n}} で、
+    最初にマッチした glob の予算を使います (書かなかった指標は確認しません)
+    測った結果は HTML のダイジェストごとに cache_path にキャッシュします
+    """
+    def __init__(self, budgets, cache_path=''):
+        self.budgets = budgets
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path and Path(cache_path).is_file():
+            self.cache = json.loads(Path(cache_path).read_text(encoding='utf8'))
+        self.sizes = {}  # サイトルートからの相対パス -> バイト数
+        self.pages = {}  # サイトルートからの相対パス -> (ダイジェスト, 予算)
+        self.offenders = []
+
+    def budget_of(self, rel):
+        for pat, budget in self.budgets.items():
+            if fnmatch.fnmatch(rel, pat):
+                return budget
+        return None
+
+    def visit(self, p, rel):
+        self.sizes[rel] = p.stat().st_size
+        if not rel.endswith('.html'):
+            return
+        budget = self.budget_of(rel)
+        if budget is None:
+            return
+        data = p.read_bytes()
+        digest = File.digest(data)
+        if digest not in self.cache:
+            self.cache[digest] = [
+                len(data), len(gzip.compress(data, mtime=0)), local_refs(data),
+            ]
+        self.pages[rel] = (digest, budget)
+
+    def measure(self, rel):
+        digest, _ = self.pages[rel]
+        size, gzip_size, refs = self.cache[digest]
+        base = PurePosixPath(rel).parent
+        assets = {posixpath.normpath((base / ref).as_posix()) for ref in refs}
+        return {
+            'bytes': size,
+            'gzip_bytes': gzip_size,
+            'asset_bytes': sum(self.sizes.get(a, 0) for a in assets),
+        }
+
+    def finish(self):
+        """
+        予算を超えたページを超過の割合が大きい順に表示して返します
+        [(相対パス, 超過の割合, {指標: (値, 予算)}), ...]
+        """
+        self.offenders = []
+        for rel in self.pages:
+            _, budget = self.pages[rel]
+            weights = self.measure(rel)
+            over = {
+                m: (weights[m], budget[m]) for m in METRICS
+                if m in budget and weights[m] > budget[m]
+            }
+            if over:
+                ratio = max(v / b if b else float('inf') for v, b in over.values())
+                self.offenders.append((rel, ratio, over))
+        self.offenders.sort(key=lambda o: (-o[1], o[0]))
+        for rel, ratio, over in self.offenders:
+            detail = ', '.join(f'{m} {v} > {b}' for m, (v, b) in over.items())
+            logger.warning(f'予算超過 {ratio:.2f} 倍 {rel} ({detail})')
+        if self.cache_path and not File.check:  # 今回測ったページの分だけ残す
+            # キャッシュなので File を経由しない (チェックモードでは書かない)
+            used = {digest for digest, _ in self.pages.values()}
+            self.cache = {d: v for d, v in self.cache.items() if d in used}
+            Path(self.cache_path).write_text(
+                json.dumps(self.cache, ensure_ascii=False, sort_keys=True) + '\n',
+                encoding='utf8', newline='\n',
+            )
+        return self.offenders
@@ -1,13 +1,22 @@
-from cookies_site_utils.core import File
+from cookies_site_utils.core import File, FileSystemStorage, prefetch_bytes
+from cookies_site_utils.rules import validator
+import cookies_site_utils.soup_util as su
+from cookies_site_utils.css_util import page_type
+from cookies_site_utils.resources import use_bundle, sync_bundles
+import cookies_site_utils.memprof as memprof
 from pathlib import Path
 import fnmatch
 import os
 import re
+import sys
 from bs4 import BeautifulSoup
 from shirotsubaki.element import Element as Elm
 from datetime import datetime
 from jinja2 import Template
 import toml
+import json
+import heapq
+import html
 from contextlib import contextmanager
 import logging
 logger = logging.getLogger(__name__)
@@ -19,11 +28,10 @@ class PageCharCounter:
     - インライン要素の閉じタグ直後の1つ以上の改行を1つの改行とみなします
     - ブロック要素の閉じタグ直後の1つ以上の改行を無視します
     """
-    def __init__(self):
-        self.closing_tag = re.compile(r'(</[^>]+>)\n+')
-        self.inline_tags = {'span', 'a', 'code'}
-        self.void_tags = {'br', 'hr'}
-        self.void_tag = re.compile(r'(<(br|hr)\s*/?>)\n+')
+    closing_tag = re.compile(r'(</[^>]+>)\n+')
+    inline_tags = {'span', 'a', 'code'}
+    void_tags = {'br', 'hr'}
+    void_tag = re.compile(r'(<(br|hr)\s*/?>)\n+')
 
     def _closing_tag_repl(self, match):
         tag = match.group(1)
@@ -43,14 +51,80 @@ class PageCharCounter:
         return len(self.normalize(text))
 
 
-class Page(File):
+class _Linkable:
+    """
+    path, title, timestamp, url, is_index を持つページをリンクやサイトマップの
+    URL 要素にします
+    """
+    __slots__ = ()
+
+    def as_anchor(self, source_path, with_ts=False):
+        rel_path_from_source = os.path.relpath(self.path, source_path.parent)
+        rel_path_from_source = Path(rel_path_from_source).as_posix()
+        elm_a = Elm('a', self.title).set_attr('href', rel_path_from_source)
+        elm_a = str(elm_a).replace('\n', '')
+        if not with_ts:
+            return elm_a
+        elm_ts = Elm('span', self.timestamp).set_attr('class', 'index-ts')
+        elm_ts = str(elm_ts).replace('\n', '')
+        return f'{elm_a} {elm_ts}'
+
+    def as_xml_url(self):
+        priority = 1.0 if self.is_index else 0.5
+        return '\n'.join([
+            '<url>',
+            f'<loc>{self.url}</loc>',
+            f'<lastmod>{self.timestamp}</lastmod>',
+            '<changefreq>monthly</changefreq>',
+            f'<priority>{priority}</priority>',
+            '</url>',
+        ])
+
+
+class PageRecord(_Linkable):
+    """
+    評価済みページの軽量な記録です
+    目次・カテゴリページ・サイトマップの生成は Page の代わりにこれを参照します
+    - cat_ids は所属カテゴリの CategoryPage.cat_id のタプルです
+    """
+    __slots__ = ('rel_path', 'title', 'timestamp', 'count', 'cat_ids', 'is_index')
+
+    def __init__(
+        self, rel_path, title, timestamp, count=-1, cat_ids=(), is_index=False,
+    ):
+        self.rel_path = sys.intern(rel_path)
+        self.title = title
+        self.timestamp = sys.intern(timestamp)
+        self.count = count
+        self.cat_ids = tuple(cat_ids)
+        self.is_index = is_index
+
+    @property
+    def path(self):
+        return Path(File.site_root or '') / self.rel_path
+
+    @property
+    def url(self):
+        return File.domain + self.rel_path
+
+
+class Page(File, _Linkable):
     last_counts = None
     force_keep_timestamp = False
+    page_size = None  # 目次・カテゴリページの 1 ページあたりの記事数 (None で分割なし)
+    prerender_sidebar = False  # 目次・カテゴリページのサイドバーを描画済みにする
+    signatures = None  # ページ種別ごとに使われるタグ名・.クラス・#ID (集めるときのみ辞書)
+    errors = None  # エラーを集めて続行するモードで集めたエラー (続行するときのみリスト)
+    timestamp_provider = None  # ファイルタイムスタンプの代わり (git_util.GitTimestamps 等)
+    js_bundles = False  # 目次・カテゴリページで funcs.js の代わりにページ種別ごとのバンドルを使う
+    feed_size = None  # Atom フィードに載せる記事数 (None でフィードなし)
+    counter = PageCharCounter()
 
     @classmethod
     def load_last_counts(cls, last_counts_path):
         if not last_counts_path:
             logger.warning('ページ最終更新日管理ファイルが指定されていません')
+            cls.last_counts = None  # 前回のビルドのものを使わない
             return
         if not last_counts_path.is_file():
             cls.last_counts = {}
@@ -63,11 +137,13 @@ class Page(File):
     def dump_last_counts(cls, last_counts_path):
         if not last_counts_path:
             return
-        with open(last_counts_path, mode='w', encoding='utf8', newline='\n') as f:
-            toml.dump({'pages': [v[1] for v in sorted(cls.last_counts.items())]}, f)
+        pages = [v[1] for v in sorted(cls.last_counts.items())]
+        File(last_counts_path).write_text(toml.dumps({'pages': pages}))
 
     def get_file_timestamp(self):
-        return datetime.fromtimestamp(self.path.stat().st_mtime).strftime('%Y-%m-%d')
+        if Page.timestamp_provider is not None:
+            return Page.timestamp_provider.timestamp(self._key(), self.mtime())
+        return datetime.fromtimestamp(self.mtime()).strftime('%Y-%m-%d')
 
     def set_timestamp(self, count=-1):
         if Page.last_counts is None:
@@ -105,34 +181,34 @@ class Page(File):
         ]))
 
     def eval_soup(self, soup):
-        self.title = soup.find('h1').get_text()
-        if self.subsite_name is not None:
-            page_title = soup.title.get_text()
-            if self.is_index:
-                if page_title != f'{self.subsite_name}':
-                    self.raise_error('title タグがサブサイト名でない')
-            else:
-                if page_title != f'{self.title} - {self.subsite_name}':
-                    self.raise_error('title タグが h1 タグ + サブサイト名でない')
-        if not self.strict_check:
-            return
-        for tag in soup.find_all(True):
-            if tag.has_attr('style'):
-                self.raise_error('インラインスタイルがある')
-        for a in soup.find_all('a'):
-            if a.has_attr('target'):
-                self.raise_error('a タグに target 属性がある')
-
-    def parse(self):
-        text = self.path.read_text(encoding='utf8')
+        signature = None
+        if Page.signatures is not None:  # ページごとに集めてからページ種別のものに加える
+            signature = set()
+            self.signature = signature
+        errors, ctx = validator.validate(soup, self, signature)
+        if signature is not None:
+            Page.signatures.setdefault(page_type(self.rel_path), set()).update(signature)
+        if errors:
+            self.raise_error(', '.join(errors))
+        self.title = ctx['h1']
+
+    def parse(self, data=None, copy_soup=True):
+        """
+        copy_soup=False は soup を編集しないという指定です
+        (キャッシュを使うサブクラスでは共有の soup を返します)
+        """
+        if data is None:
+            text = self.read_text()
+        else:  # 先読み済みのバイト列はパースするときに復号する
+            text = File.decode(data)
         soup = BeautifulSoup(text, 'html.parser')
         return soup, text
 
-    def eval(self, return_soup=False):
-        soup, text = self.parse()
+    def eval(self, return_soup=False, data=None):
+        soup, text = self.parse(data, copy_soup=return_soup)  # 評価のみなら編集しない
         self.eval_soup(soup)
-        count = self.counter(text)
-        self.set_timestamp(count=count)
+        self.count = self.counter(text)
+        self.set_timestamp(count=self.count)
         if return_soup:
             return soup
 
@@ -141,34 +217,105 @@ class Page(File):
         self.subsite_name = subsite_name
         self.strict_check = strict_check
         self.is_index = (type(self).__name__ == 'IndexPage')
-        self.counter = PageCharCounter()
+        self.count = -1
+        self.signature = None  # シグネチャを集めるときのみこのページのシグネチャ
 
-    def generate_from_template(self, template, context):
+    def generate_from_template(self, template, context, marker=''):
         rendered = template.render(context) + '\n'
+        if Page.js_bundles:
+            rendered = use_bundle(rendered, page_type(self.rel_path))
+        if Page.prerender_sidebar:
+            soup = BeautifulSoup(rendered, 'html.parser')
+            if su.prerender_sidebar(soup):
+                rendered = str(soup)
+        rendered += marker
         self.write_text(rendered)
-        self.eval()
+        self.eval(data=rendered.encode('utf8'))  # 書き込んだ内容を読み直さない
 
-    def as_anchor(self, source_path, with_ts=False):
-        rel_path_from_source = os.path.relpath(self.path, source_path.parent)
-        rel_path_from_source = Path(rel_path_from_source).as_posix()
-        elm_a = Elm('a', self.title).set_attr('href', rel_path_from_source)
-        elm_a = str(elm_a).replace('\n', '')
-        if not with_ts:
-            return elm_a
-        elm_ts = Elm('span', self.timestamp).set_attr('class', 'index-ts')
-        elm_ts = str(elm_ts).replace('\n', '')
-        return f'{elm_a} {elm_ts}'
+    paginated_marker = '<!-- csu: paginated -->\n'  # 分割して生成した 2 ページ目以降の印
 
-    def as_xml_url(self):
-        priority = 1.0 if self.is_index else 0.5
-        return '\n'.join([
-            '<url>',
-            f'<loc>{self.url}</loc>',
-            f'<lastmod>{self.timestamp}</lastmod>',
-            '<changefreq>monthly</changefreq>',
-            f'<priority>{priority}</priority>',
-            '</url>',
-        ])
+    @staticmethod
+    def paginate(items):
+        if not Page.page_size:
+            return [items]
+        n = Page.page_size
+        return [items[i:i + n] for i in range(0, len(items), n)] or [items]
+
+    def paginated_path(self, i):
+        """
+        i 番目 (0 始まり) のページのパスです x.html, x-2.html, x-3.html, ...
+        """
+        if i == 0:
+            return self.path
+        return self.path.with_name(f'{self.path.stem}-{i + 1}{self.path.suffix}')
+
+    @staticmethod
+    def as_pagination(prev_url, next_url, page_number, n_pages):
+        if n_pages <= 1:
+            return ''
+        div = Elm('div').set_attr('class', 'pagination')
+        if prev_url:
+            div.append(Elm('a', '前へ').set_attr('href', prev_url))
+        div.append(Elm('span', f'{page_number} / {n_pages}'))
+        if next_url:
+            div.append(Elm('a', '次へ').set_attr('href', next_url))
+        return str(div)
+
+    def generate_paginated(
+        self, template, context, list_articles, keep_paths=(), first_context=None,
+    ):
+        """
+        list_articles の各要素を list_article として 1 ページずつ生成します
+        first_context は先頭ページにのみ渡します
+        2 ページ目以降のページの PageRecord を返します
+        分割するときは、分割数が減って不要になったページを削除します
+        (keep_paths に含まれるもの・リダイレクトは残し、分割して生成した印のないページはエラー)
+        """
+        n_pages = len(list_articles)
+        sub_pages = []
+        for i, list_article in enumerate(list_articles):
+            prev_url = self.paginated_path(i - 1).name if i > 0 else ''
+            next_url = self.paginated_path(i + 1).name if i < n_pages - 1 else ''
+            context_i = dict(
+                context,
+                list_article=list_article,
+                page_number=i + 1,
+                n_pages=n_pages,
+                prev_url=prev_url,
+                next_url=next_url,
+                pagination=Page.as_pagination(prev_url, next_url, i + 1, n_pages),
+            )
+            if i == 0:
+                context_i.update(first_context or {})
+                Page.generate_from_template(self, template, context_i)
+                continue
+            page = Page(self.paginated_path(i), self.subsite_name, self.strict_check)
+            page.is_index = self.is_index
+            Page.generate_from_template(page, template, context_i, Page.paginated_marker)
+            sub_pages.append(page.to_record())
+
+        i = n_pages
+        while Page.page_size and File(self.paginated_path(i)).exists():
+            if self.paginated_path(i) in keep_paths:
+                break
+            stale = File(self.paginated_path(i), verbose=True)
+            text = stale.read_text()
+            if su.is_redirect(text):  # カテゴリ名の付け替え元
+                break
+            if Page.paginated_marker not in text:
+                kind = '目次ページ' if self.is_index else 'カテゴリページ'
+                raise ValueError(f'廃れた{kind} {stale.path}')
+            stale.unlink()
+            if Page.last_counts is not None:
+                Page.last_counts.pop(stale.rel_path, None)
+            i += 1
+        return sub_pages
+
+    def to_record(self, cat_ids=()):
+        return PageRecord(
+            self.rel_path, self.title, self.timestamp, self.count,
+            cat_ids, self.is_index,
+        )
 
     @staticmethod
     def as_ul_of_links(pages, source_path, with_ts=False, n_max=None):
@@ -183,18 +330,17 @@ class Page(File):
 class CategoryPage(Page):
     additional_context = {}
 
-    def __init__(self, cat_name, path, subsite_name):
+    def __init__(self, cat_name, path, subsite_name, cat_id=-1):
         super().__init__(path, subsite_name)
         self.cat_name = cat_name
+        self.cat_id = cat_id
         self.articles = []
         self.articles_with_subcat = {}
+        self.sub_pages = []
 
-    def generate_from_template(self, template):
+    def generate_from_template(self, template, keep_paths=()):
         self.articles.sort(key=lambda a: a.title.lower())
-        list_article = Page.as_ul_of_links(
-            self.articles, self.path, with_ts=True,
-        )
-        n_articles = len(self.articles)
+        entries = [(None, a) for a in self.articles]
         if len(self.articles_with_subcat) > 0:
             self.articles_with_subcat = list(sorted(
                 self.articles_with_subcat.items(),
@@ -202,49 +348,242 @@ class CategoryPage(Page):
             ))
             for subcat, articles in self.articles_with_subcat:
                 articles.sort(key=lambda a: a.title.lower())
-                n_articles += len(articles)
+                entries += [(subcat, a) for a in articles]
+
+        list_articles = []
+        for i, entries_i in enumerate(Page.paginate(entries)):
+            # サブカテゴリなしの記事一覧は先頭ページには必ず置く
+            list_article = ''
+            if i == 0 or (entries_i and entries_i[0][0] is None):
+                list_article = Page.as_ul_of_links(
+                    [a for subcat, a in entries_i if subcat is None],
+                    self.path, with_ts=True,
+                )
+            subcats = []
+            for subcat, _ in entries_i:
+                if subcat is not None and subcat not in subcats:
+                    subcats.append(subcat)
+            for subcat in subcats:
                 list_article += f'\n<h3>{subcat}</h3>\n'
                 list_article += Page.as_ul_of_links(
-                    articles, self.path, with_ts=True,
+                    [a for s, a in entries_i if s == subcat],
+                    self.path, with_ts=True,
                 )
+            list_articles.append(list_article)
 
         context = {
             'category_name': self.cat_name,
-            'n_articles': n_articles,
-            'list_article': list_article,
+            'n_articles': len(entries),
         }
         context.update(CategoryPage.additional_context)
-        super().generate_from_template(template, context)
+        self.sub_pages = self.generate_paginated(
+            template, context, list_articles, keep_paths,
+        )
+
+
+def article_entry(article, soup):
+    """
+    評価済みの記事ページを JSON にできる辞書にします (分割ビルドとチェックポイント用)
+    カテゴリページパスはサイトルートからの相対パスにします
+    """
+    site_root = Path(File.site_root).resolve()
+    entry = {
+        'rel_path': article.rel_path,
+        'title': article.title,
+        'timestamp': article.timestamp,
+        'count': article.count,
+        'categories': [
+            [name, Path(os.path.relpath(cat_path, site_root)).as_posix(), subcat]
+            for name, cat_path, subcat in article.iter_categories(soup)
+        ],
+    }
+    if article.signature is not None:
+        entry['signature'] = sorted(article.signature)
+    return entry
+
+
+def restore_signature(entry):
+    """
+    評価しなかった記事ページのシグネチャを Page.signatures に加えます
+    """
+    if Page.signatures is not None:
+        signature = Page.signatures.setdefault(page_type(entry['rel_path']), set())
+        signature.update(entry['signature'])
+
+
+def entry_memberships(entry):
+    site_root = Path(File.site_root).resolve()
+    return [
+        (name, (site_root / cat_path).resolve(), subcat)
+        for name, cat_path, subcat in entry['categories']
+    ]
+
+
+@contextmanager
+def collecting_errors():
+    """
+    エラーを集めて続行するモードではページ単位のエラーを Page.errors に集めます
+    """
+    if Page.errors is None:
+        yield
+        return
+    try:
+        yield
+    except ValueError as e:
+        logger.error(str(e))
+        Page.errors.append(str(e))
+
+
+def register_categories(
+    memberships, all_cats, all_cat_paths, subsite_name, make_record, raise_error,
+):
+    """
+    記事の所属カテゴリ [(カテゴリ名, カテゴリページパス, サブカテゴリ)] を all_cats に
+    登録し、make_record(カテゴリ ID のリスト) で作った PageRecord をカテゴリに登録して返します
+    カテゴリ名やカテゴリページパスのゆれがあれば raise_error(メッセージ) を呼びます
+    """
+    cats = []
+    new_cats = {}  # ゆれがあれば何も登録しないよう確認が済むまで all_cats に入れない
+    for cat_name, cat_path, subcat in memberships:
+        cat = all_cats.get(cat_name) or new_cats.get(cat_name)
+        if cat is None:
+            if cat_path in all_cat_paths or any(
+                c.path == cat_path for c in new_cats.values()
+            ):
+                raise_error(f'カテゴリ名のゆれ {cat_name}')
+            cat = CategoryPage(
+                cat_name, cat_path, subsite_name, len(all_cats) + len(new_cats),
+            )
+            new_cats[cat_name] = cat
+        elif cat_path != cat.path:
+            raise_error(f'カテゴリページパスのゆれ {cat_path}')
+        cats.append((cat, subcat))
+    for cat_name, cat in new_cats.items():
+        all_cats[cat_name] = cat
+        all_cat_paths.add(cat.path)
+
+    record = make_record([cat.cat_id for cat, _ in cats])
+    for cat, subcat in cats:
+        if subcat is None:
+            cat.articles.append(record)
+        else:
+            if subcat not in cat.articles_with_subcat:
+                cat.articles_with_subcat[subcat] = []
+            cat.articles_with_subcat[subcat].append(record)
+    return record
 
 
 class ArticlePage(Page):
-    def collect_categories(self, soup, all_cats, all_cat_paths):
+    def iter_categories(self, soup):
+        """
+        所属カテゴリ [(カテゴリ名, カテゴリページパス, サブカテゴリ)] を返します
+        """
         elm_cats = soup.find(class_='categories')
-        if elm_cats is not None:
-            cats = elm_cats.find_all('a')
-            for cat in cats:
-                cat_name = cat.get_text()
-                cat_path = (self.path.parent / Path(cat['href'])).resolve()
-                if cat_name not in all_cats:
-                    if cat_path in all_cat_paths:
-                        self.raise_error(f'カテゴリ名のゆれ {cat_name}')
-                    all_cats[cat_name] = CategoryPage(
-                        cat_name, cat_path, self.subsite_name,
-                    )
-                    all_cat_paths.add(cat_path)
-                elif cat_path != all_cats[cat_name].path:
-                    self.raise_error(f'カテゴリページパスのゆれ {cat_path}')
-                subcat = cat.get('data-subcat')
-                if subcat is None:
-                    all_cats[cat_name].articles.append(self)
-                else:
-                    if subcat not in all_cats[cat_name].articles_with_subcat:
-                        all_cats[cat_name].articles_with_subcat[subcat] = []
-                    all_cats[cat_name].articles_with_subcat[subcat].append(self)
+        if elm_cats is None:
+            return []
+        return [
+            (
+                cat.get_text(),
+                (self.path.parent / Path(cat['href'])).resolve(),
+                cat.get('data-subcat'),
+            )
+            for cat in elm_cats.find_all('a')
+        ]
+
+    def collect_categories(self, soup, all_cats, all_cat_paths):
+        """
+        所属カテゴリを all_cats に登録し、カテゴリに登録した PageRecord を返します
+        """
+        return register_categories(
+            self.iter_categories(soup), all_cats, all_cat_paths,
+            self.subsite_name, self.to_record, self.raise_error,
+        )
 
 
 class IndexPage(Page):
     additional_context = {}
+    prefetch_workers = 4  # 記事ページを先読みするスレッド数
+    prefetch_max_bytes = 64 * 1024 * 1024  # 先読み中の記事ページの合計バイト数の上限
+    checkpoint = None  # 相対パス -> 評価済みの記事 (チェックポイントを使うときのみ辞書)
+    checkpoint_path = ''
+    checkpoint_interval = 1000  # この記事数ごとにチェックポイントを書き出す
+    feed_candidates = []  # 各サブサイトのフィードの記事 (サイト全体のフィード用)
+    feed_paths = set()  # 書き出したサブサイトのフィードのパス
+
+    @classmethod
+    def load_checkpoint(cls, checkpoint_path):
+        cls.checkpoint_path = checkpoint_path
+        cls.checkpoint = None
+        if not checkpoint_path:
+            return
+        cls.checkpoint = {}
+        if Path(checkpoint_path).is_file():
+            cls.checkpoint = json.loads(Path(checkpoint_path).read_text(encoding='utf8'))
+
+    @classmethod
+    def dump_checkpoint(cls):
+        # 出力ではなくキャッシュなので File を経由しない (チェックモードでも表示しない)
+        if cls.checkpoint is None or File.check:
+            return
+        Path(cls.checkpoint_path).write_text(
+            json.dumps(cls.checkpoint, ensure_ascii=False, sort_keys=True) + '\n',
+            encoding='utf8', newline='\n',
+        )
+
+    @staticmethod
+    def checkpointed(article_path, subsite_name):
+        """
+        チェックポイントにある評価結果がこのファイルのものであればそれを返します
+        """
+        if IndexPage.checkpoint is None:
+            return None
+        entry = IndexPage.checkpoint.get(File(article_path).rel_path)
+        if entry is None or entry['subsite_name'] != subsite_name:
+            return None
+        stat = article_path.stat()
+        if entry['stat'] != [stat.st_mtime_ns, stat.st_size]:
+            return None
+        if Page.signatures is not None and 'signature' not in entry:
+            return None  # シグネチャを集めなかったときの評価結果
+        return entry
+
+    @staticmethod
+    def restore(entry, article_path, subsite_name):
+        """
+        評価しなかった記事ページのページ更新日とシグネチャを今回のビルドに反映します
+        """
+        article = ArticlePage(article_path, subsite_name)
+        article.title = entry['title']
+        article.count = entry['count']
+        article.set_timestamp(count=article.count)
+        entry['timestamp'] = article.timestamp
+        restore_signature(entry)
+        return article
+
+    @staticmethod
+    def checkpoint_entry(article, soup):
+        stat = article.path.stat()
+        return dict(article_entry(article, soup), stat=[stat.st_mtime_ns, stat.st_size])
+
+    @staticmethod
+    def record_checkpoint(entry, subsite_name):
+        if IndexPage.checkpoint is None:
+            return
+        IndexPage.checkpoint[entry['rel_path']] = dict(entry, subsite_name=subsite_name)
+        n = len(IndexPage.checkpoint)
+        if n % IndexPage.checkpoint_interval == 0:
+            IndexPage.dump_checkpoint()
+
+    @staticmethod
+    def forget_missing(subsite_name, seen):
+        """
+        チェックポイントから消えた記事ページ (相対パスが seen にないもの) を忘れます
+        """
+        if IndexPage.checkpoint is None:
+            return
+        for rel_path, entry in list(IndexPage.checkpoint.items()):
+            if entry['subsite_name'] == subsite_name and rel_path not in seen:
+                del IndexPage.checkpoint[rel_path]
 
     def collect_articles(self):
         # 記事ページ収集
@@ -253,30 +592,71 @@ class IndexPage(Page):
         all_cats = {}
         all_cat_paths = set()
         article_dir = self.path.parent / 'articles'
-        for article_path in Path(article_dir).glob('*.html'):
-            article = ArticlePage(article_path, self.subsite_name)
-            soup = article.eval(return_soup=True)
-            article.collect_categories(soup, all_cats, all_cat_paths)
-            articles.append(article)
+
+        # チェックポイントから変わっていない記事ページは読まない
+        article_paths = []
+        seen = set()
+        for article_path in sorted(Path(article_dir).glob('*.html')):
+            seen.add(File(article_path).rel_path)
+            entry = IndexPage.checkpointed(article_path, self.subsite_name)
+            if entry is None:
+                article_paths.append(article_path)
+                continue
+            with collecting_errors():
+                article = IndexPage.restore(entry, article_path, self.subsite_name)
+                articles.append(register_categories(
+                    entry_memberships(entry), all_cats, all_cat_paths,
+                    self.subsite_name, article.to_record, article.raise_error,
+                ))
+
+        for article_path, data in prefetch_bytes(
+            article_paths,
+            IndexPage.prefetch_workers,
+            IndexPage.prefetch_max_bytes,
+        ):
+            with collecting_errors():
+                if IndexPage.checkpoint is not None:
+                    IndexPage.checkpoint.pop(File(article_path).rel_path, None)
+                article = ArticlePage(article_path, self.subsite_name)
+                soup = article.eval(return_soup=True, data=data)
+                articles.append(
+                    article.collect_categories(soup, all_cats, all_cat_paths)
+                )
+                if IndexPage.checkpoint is not None:
+                    IndexPage.record_checkpoint(
+                        IndexPage.checkpoint_entry(article, soup), self.subsite_name,
+                    )
+        IndexPage.forget_missing(self.subsite_name, seen)
         return articles, list(all_cats.values()), all_cat_paths
 
     def generate_categories(self, cat_template_path, all_cat_paths):
         logger.info('カテゴリページ生成')
         cat_template = Template(cat_template_path.read_text(encoding='utf8'))
+        File.preload([cat.path for cat in self.all_cats])  # 比較用にまとめて読む
         for cat in self.all_cats:
-            cat.generate_from_template(cat_template)
+            with collecting_errors():
+                cat.generate_from_template(cat_template, all_cat_paths)
+        page_paths = set(all_cat_paths)
+        for cat in self.all_cats:
+            page_paths.update(
+                cat.paginated_path(i + 1) for i in range(len(cat.sub_pages))
+            )
 
         # 廃れたカテゴリページがないことの確認
         cat_dir = self.path.parent / 'categories'
         for cat_path in Path(cat_dir).glob('*.html'):
-            if cat_path not in all_cat_paths:
-                raise ValueError(f'廃れたカテゴリページ {cat_path}')
+            if cat_path not in page_paths and File(cat_path).exists():
+                if su.is_redirect(File(cat_path).read_text()):  # カテゴリ名の付け替え元
+                    continue
+                with collecting_errors():  # 続行するモードでは目次ページの生成まで続ける
+                    raise ValueError(f'廃れたカテゴリページ {cat_path}')
 
     def __init__(
         self,
         subsite_root,
         subsite_template_root,
         subsite_name,
+        collected=None,  # 収集済みの (記事, カテゴリ, カテゴリページパス) (分割ビルド用)
     ):
         index_template_path = subsite_template_root / 'index_template.html'
         cat_template_path = subsite_template_root / 'category_template.html'
@@ -284,43 +664,62 @@ class IndexPage(Page):
             raise ValueError(f'テンプレートがありません {index_template_path}')
 
         super().__init__(subsite_root / 'index.html', subsite_name)
-        self.articles, self.all_cats, all_cat_paths = self.collect_articles()
+        self.sub_pages = []
+        if collected is None:
+            collected = self.collect_articles()
+        self.articles, self.all_cats, all_cat_paths = collected
+        memprof.stage(f'{subsite_name}/collect_articles')
 
         # 「記事一覧」 (タイトル順ソート)
         self.articles.sort(key=lambda a: a.title.lower())
-        list_article = Page.as_ul_of_links(self.articles, self.path, with_ts=True)
+        list_articles = [
+            Page.as_ul_of_links(articles, self.path, with_ts=True)
+            for articles in Page.paginate(self.articles)
+        ]
 
         # 「更新日が新しい記事」 (同一更新日はタイトル順に)
-        self.articles.sort(key=lambda a: a.timestamp, reverse=True)
         list_article_recent = Page.as_ul_of_links(
-            self.articles, self.path, with_ts=True, n_max=10,
+            recent_articles(self.articles, 10), self.path, with_ts=True,
         )
-
-        # 無駄なサイトマップ更新を防ぐためタイトル順に戻しておく
-        self.articles.sort(key=lambda a: a.title.lower())
+        if Page.feed_size is not None:
+            recent = recent_articles(self.articles, Page.feed_size)
+            feed_path = Path(os.path.abspath(self.path.parent / 'feed.xml'))
+            Feed(feed_path, subsite_name, self.url, recent)
+            IndexPage.feed_candidates += recent
+            IndexPage.feed_paths.add(feed_path)
 
         # カテゴリページ生成
         self.all_cats.sort(key=lambda c: c.cat_name.lower())
         if cat_template_path.is_file():
             self.generate_categories(cat_template_path, all_cat_paths)
+        memprof.stage(f'{subsite_name}/generate_categories')
         print(self.all_cats[0].path)
         list_category = Page.as_ul_of_links(self.all_cats, self.path)
 
         # 目次ページ自身の生成
         logger.info('目次ページ生成')
         template = Template(index_template_path.read_text(encoding='utf8'))
+        # 2 ページ目以降には「更新日が新しい記事」とカテゴリ一覧を渡さない
+        # (一覧の該当範囲が変わらないページは書き換わらないように)
         context = {
             'n_article': len(self.articles),
-            'list_article': list_article,
-            'list_article_recent': list_article_recent,
             'n_category': len(self.all_cats),
-            'list_category': list_category,
         }
         context.update(IndexPage.additional_context)
-        self.generate_from_template(template, context)
+        first_context = {
+            'list_article_recent': list_article_recent,
+            'list_category': list_category,
+        }
+        self.sub_pages = self.generate_paginated(
+            template, context, list_articles, first_context=first_context,
+        )
+        memprof.stage(f'{subsite_name}/render_index')
 
     def get_pages(self):
-        return [self] + self.articles + self.all_cats
+        pages = [self] + self.sub_pages + self.articles + self.all_cats
+        for cat in self.all_cats:
+            pages += cat.sub_pages
+        return pages
 
 
 class Sitemap(File):
@@ -336,9 +735,77 @@ class Sitemap(File):
             '</urlset>',
         ]
         self.write_text('\n'.join(lines) + '\n')
+        memprof.stage('sitemap')
+
+
+def recent_articles(articles, n):
+    """
+    更新日が新しい記事 n 件を返します (同一更新日は元の順、全体をソートしません)
+    """
+    return heapq.nlargest(n, articles, key=lambda a: a.timestamp)
 
 
-def find_disallowed(path, allowlist, raise_error=True):
+class Feed(File):
+    """
+    更新日が新しい記事の Atom フィードです (要約は記事の div.summary から取ります)
+    載せる記事・タイトル・更新日が前回と同じなら書き換えません (条件付き GET のため)
+    """
+    marker = re.compile(r'<!-- entries: ([0-9a-f]+) -->')
+
+    def __init__(self, path, title, index_url, articles):
+        super().__init__(path)
+        digest = File.digest(json.dumps([
+            title, index_url, [(a.rel_path, a.title, a.timestamp) for a in articles],
+        ], ensure_ascii=False).encode('utf8'))
+        if self.exists():
+            m = Feed.marker.search(self.read_text())
+            if m is not None and m.group(1) == digest:
+                self.log(f'更新なし {self.rel_path}')
+                return
+        logger.info(f'フィード生成 {self.rel_path}')
+        summaries = Feed.summaries(articles)
+        updated = max((a.timestamp for a in articles), default='1970-01-01')
+        lines = [
+            '<?xml version="1.0" encoding="utf-8"?>',
+            f'<!-- entries: {digest} -->',
+            '<feed xmlns="http://www.w3.org/2005/Atom">',
+            f'<title>{html.escape(title)}</title>',
+            f'<id>{html.escape(index_url)}</id>',
+            f'<link href="{html.escape(index_url)}"/>',
+            f'<link rel="self" href="{html.escape(self.url)}"/>',
+            f'<updated>{updated}T00:00:00Z</updated>',
+        ]
+        for a, summary in zip(articles, summaries):
+            url = html.escape(File.domain + a.rel_path)
+            lines += [
+                '<entry>',
+                f'<title>{html.escape(a.title)}</title>',
+                f'<id>{url}</id>',
+                f'<link href="{url}"/>',
+                f'<updated>{a.timestamp}T00:00:00Z</updated>',
+                f'<summary>{html.escape(summary)}</summary>',
+                '</entry>',
+            ]
+        lines.append('</feed>')
+        self.write_text('\n'.join(lines) + '\n')
+
+    @staticmethod
+    def summaries(articles):
+        paths = [Path(File.site_root) / a.rel_path for a in articles]
+        result = []
+        for _, data in prefetch_bytes(paths):
+            summary = BeautifulSoup(File.decode(data), 'html.parser').find(
+                'div', class_='summary',
+            )
+            result.append('' if summary is None else ' '.join(summary.get_text().split()))
+        return result
+
+
+def find_disallowed(path, allowlist, raise_error=True, budget=None):
+    """
+    許可リストにないファイルを返します
+    budget (budget.PageBudget) を渡すと同じ走査でページの重さも予算と比べます
+    """
     result = []
     for p in path.rglob('*'):
         if not p.is_file():
@@ -347,8 +814,14 @@ def find_disallowed(path, allowlist, raise_error=True):
         ok = any(fnmatch.fnmatch(rel, pat) for pat in allowlist)
         if not ok:
             result.append(rel)
+        if budget is not None:
+            budget.visit(p, rel)
     if result and raise_error:
         raise ValueError(f'許可されていないファイルがあります {result}')
+    if budget is not None and budget.finish() and raise_error:
+        raise ValueError(
+            f'予算を超えたページがあります {[o[0] for o in budget.offenders]}'
+        )
     return result
 
 
@@ -358,13 +831,75 @@ def build_index(
     last_counts_path='',  # ページ文字数最終更新日管理ファイルのパス
     domain='',  # ドメイン https://hoge.com/ (サイトマップ用)
     force_keep_timestamp = False,  # タイムスタンプを保つ (メンテナンス用)
+    page_size=None,  # 目次・カテゴリページを分割するときの 1 ページあたりの記事数
+    prefetch_workers=4,  # 記事ページを先読みするスレッド数
+    prefetch_max_bytes=64 * 1024 * 1024,  # 先読み中の記事ページの合計バイト数の上限
+    check=False,  # 書き込まずに更新が必要なファイルを表示する (あれば終了コード 1)
+    prerender_sidebar=False,  # 目次・カテゴリページのサイドバーを描画済みにする
+    collect_signatures=False,  # クリティカル CSS 用にページ種別ごとのシグネチャを集める
+    keep_going=False,  # ページ単位のエラーを集めて続行し最後にまとめて表示する (あれば終了コード 1)
+    checkpoint_path='',  # 評価済みの記事ページを記録しておき次回は変わったものだけ評価する
+    storage=None,  # 書き込み先 (core.MemoryStorage, core.ArchiveStorage など、最後に閉じる)
+    timestamp_provider=None,  # ファイルタイムスタンプの代わり (git_util.GitTimestamps 等)
+    js_bundles=False,  # 目次・カテゴリページで funcs.js の代わりにページ種別ごとのバンドルを使う (最後に書き出す)
+    feed_size=None,  # 更新日が新しい記事をこの件数載せた Atom フィード feed.xml を生成する
+    feed_title='',  # サイト全体のフィードのタイトル (サブサイトのフィードはサブサイト名)
+    memory_report_path='',  # tracemalloc でステージごとのメモリを計測し JSON に書き出す
 ):
     """
     サイトのインデックスとサイトマップを生成するためのコンテクストを与えます
     """
+    if js_bundles and not collect_signatures:  # バンドルのモジュールはシグネチャから選ぶ
+        raise ValueError('js_bundles には collect_signatures が必要です')
+    if storage is not None:
+        File.storage = storage
+    if check:
+        File.start_check()
     File.site_root = site_root
     File.domain = domain
     Page.force_keep_timestamp = force_keep_timestamp
+    Page.page_size = page_size
+    Page.prerender_sidebar = prerender_sidebar
+    Page.signatures = {} if collect_signatures else None
+    IndexPage.prefetch_workers = prefetch_workers
+    IndexPage.prefetch_max_bytes = prefetch_max_bytes
+    Page.errors = [] if keep_going else None
+    Page.timestamp_provider = timestamp_provider
+    Page.js_bundles = js_bundles
     Page.load_last_counts(last_counts_path)  # ページ更新日をロード
-    yield
-    Page.dump_last_counts(last_counts_path)  # ページ更新日をダンプ
+    IndexPage.load_checkpoint(checkpoint_path)
+    if feed_size is not None and not domain:  # Atom の id は絶対 URL でなければならない
+        logger.warning('ドメインが指定されていないので Atom フィードを生成しません')
+        feed_size = None
+    Page.feed_size = feed_size
+    IndexPage.feed_candidates = []
+    IndexPage.feed_paths = set()
+    profile = memprof.start(memory_report_path)
+    try:
+        yield
+        site_feed = Path(os.path.abspath(Path(site_root) / 'feed.xml'))
+        if feed_size is not None and site_feed not in IndexPage.feed_paths:
+            # 各サブサイトの上位 feed_size 件からサイト全体の上位を選ぶ
+            candidates = sorted(IndexPage.feed_candidates, key=lambda a: a.title.lower())
+            Feed(
+                site_feed, feed_title or domain, domain,
+                recent_articles(candidates, feed_size),
+            )
+        if js_bundles:  # 参照するページと同じビルドで書き出す
+            sync_bundles(site_root, Page.signatures)
+    finally:  # 途中で止まってもそれまでの進捗を残す
+        Page.dump_last_counts(last_counts_path)  # ページ更新日をダンプ
+        IndexPage.dump_checkpoint()
+        changed = File.finish_check() if check else []
+        File.preloaded = {}
+        if storage is not None:
+            storage.close()
+            File.storage = FileSystemStorage()
+        if profile is not None:
+            profile.finish()
+    if Page.errors:
+        logger.error(f'{len(Page.errors)} 件のエラーがありました')
+        for msg in Page.errors:
+            logger.error(msg)
+    if changed or Page.errors:
+        raise SystemExit(1)
@@ -0,0 +1,52 @@
+from cookies_site_utils.core import File
+from pathlib import Path
+import json
+import re
+import os
+
+_CATEGORY_HREF = re.compile(rb'href="(?:\.\./)?categories/([^"/]+)\.html"')
+
+
+class CategoryIndex:
+    """
+    記事パス -> リンクしているカテゴリページのファイル名 (拡張子なし) のインデックスです
+    index_path に保存しておき、更新時刻とサイズが変わった記事のみ
+    バイト列からカテゴリページへのリンクを探し直します (パースはしません)
+    本文中のリンクも拾うので、実際に所属しているかは記事をパースして確かめてください
+    """
+    def __init__(self, index_path=''):
+        self.index_path = index_path
+        self.entries = {}  # 絶対パス -> {'stat': [mtime, size], 'categories': [...]}
+        if index_path and Path(index_path).is_file():
+            self.entries = json.loads(Path(index_path).read_text(encoding='utf8'))
+
+    def categories_of(self, path):
+        key = Path(os.path.abspath(path)).as_posix()
+        stat = Path(path).stat()
+        entry = self.entries.get(key)
+        if entry is None or entry['stat'] != [stat.st_mtime_ns, stat.st_size]:
+            data = Path(path).read_bytes()
+            stems = {m.decode('utf8') for m in _CATEGORY_HREF.findall(data)}
+            entry = {
+                'stat': [stat.st_mtime_ns, stat.st_size],
+                'categories': sorted(stems),
+            }
+            self.entries[key] = entry
+        return entry['categories']
+
+    def articles_of(self, paths, cat_stems):
+        """
+        paths のうち cat_stems のいずれかにリンクしている記事を返します
+        """
+        cat_stems = set(cat_stems)
+        return [p for p in paths if cat_stems & set(self.categories_of(p))]
+
+    def dump(self):
+        # キャッシュなので File を経由しない (チェックモードでは書かない)
+        if not self.index_path or File.check:
+            return
+        self.entries = {k: v for k, v in self.entries.items() if Path(k).is_file()}
+        Path(self.index_path).write_text(
+            json.dumps(self.entries, ensure_ascii=False, sort_keys=True) + '\n',
+            encoding='utf8', newline='\n',
+        )
@@ -1,12 +1,186 @@
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import tarfile
+import zipfile
+import time
+import io
 import os
 import logging
 logger = logging.getLogger(__name__)
 
 
+class FileSystemStorage:
+    """
+    実ファイルシステムに読み書きします
+    """
+    def exists(self, path):
+        return path.is_file()
+
+    def read_bytes(self, path):
+        return path.read_bytes()
+
+    def read_many(self, paths, max_workers=4):
+        """
+        存在するファイルをまとめて先読みして {path: bytes} を返します
+        """
+        paths = [path for path in paths if self.exists(path)]
+        return dict(prefetch_bytes(paths, max_workers))
+
+    def mtime(self, path):
+        return path.stat().st_mtime
+
+    def write_bytes(self, path, data):
+        if not path.parent.exists():
+            path.parent.mkdir(parents=True)
+        path.write_bytes(data)
+
+    def delete(self, path):
+        path.unlink()
+
+    def close(self):
+        pass
+
+
+class MemoryStorage:
+    """
+    書き込みをメモリに溜めます (書き込んでいないファイルは base から読みます)
+    テストやチェックモード用です
+    """
+    def __init__(self, base=None):
+        self.base = base or FileSystemStorage()
+        self.files = {}  # 絶対パス -> 書き込んだ内容 (削除は None)
+
+    def exists(self, path):
+        if path in self.files:
+            return self.files[path] is not None
+        return self.base.exists(path)
+
+    def read_bytes(self, path):
+        if path in self.files:
+            if self.files[path] is None:
+                raise FileNotFoundError(path)
+            return self.files[path]
+        return self.base.read_bytes(path)
+
+    def read_many(self, paths, max_workers=4):
+        result = {p: self.files[p] for p in paths if self.files.get(p) is not None}
+        rest = [p for p in paths if p not in self.files]
+        result.update(self.base.read_many(rest, max_workers))
+        return result
+
+    def mtime(self, path):
+        if path in self.files:  # 書き込んだファイルは今書き込まれたものとする
+            return time.time()
+        return self.base.mtime(path)
+
+    def write_bytes(self, path, data):
+        self.files[path] = data
+
+    def delete(self, path):
+        self.files[path] = None
+
+    def close(self):
+        pass
+
+
+class ArchiveStorage:
+    """
+    root 以下への書き込みを zip または tar (.tar, .tar.gz, .tgz) のアーカイブに直接書き出し、
+    close するときに書き込まなかった root 以下のファイルも base から書き出します
+    root の外への書き込み (ページ更新日管理ファイルなど) は base に書き込みます
+    アーカイブには内容を残さないので、書き込んだファイルを読み直すことはできません
+    """
+    def __init__(self, archive_path, root, base=None):
+        self.archive_path = Path(os.path.abspath(archive_path))
+        self.root = Path(os.path.abspath(root))
+        self.base = base or FileSystemStorage()
+        self.written = set()
+        self.deleted = set()
+        name = self.archive_path.name
+        if name.endswith('.zip'):
+            self.archive = zipfile.ZipFile(
+                self.archive_path, 'w', compression=zipfile.ZIP_DEFLATED,
+            )
+        elif name.endswith(('.tar', '.tar.gz', '.tgz')):
+            mode = 'w' if name.endswith('.tar') else 'w:gz'
+            self.archive = tarfile.open(self.archive_path, mode)
+        else:
+            raise ValueError(f'未対応のアーカイブ形式です {archive_path}')
+
+    def _inside(self, path):
+        return path.is_relative_to(self.root)
+
+    def _add(self, path, data):
+        arcname = path.relative_to(self.root).as_posix()
+        if isinstance(self.archive, zipfile.ZipFile):
+            self.archive.writestr(arcname, data)
+        else:
+            info = tarfile.TarInfo(arcname)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def exists(self, path):
+        if path in self.written:
+            return True
+        if path in self.deleted:
+            return False
+        return self.base.exists(path)
+
+    def read_bytes(self, path):
+        if path in self.written:
+            raise ValueError(f'アーカイブに書き込んだファイルは読めません {path}')
+        if path in self.deleted:
+            raise FileNotFoundError(path)
+        return self.base.read_bytes(path)
+
+    def read_many(self, paths, max_workers=4):
+        rest = [p for p in paths if p not in self.written and p not in self.deleted]
+        return self.base.read_many(rest, max_workers)
+
+    def mtime(self, path):
+        if path in self.written:
+            return time.time()
+        return self.base.mtime(path)
+
+    def write_bytes(self, path, data):
+        if not self._inside(path):
+            self.base.write_bytes(path, data)
+            return
+        if path in self.written:
+            raise ValueError(f'アーカイブに同じファイルを 2 回書き込もうとしました {path}')
+        self.written.add(path)
+        self.deleted.discard(path)
+        self._add(path, data)
+
+    def delete(self, path):
+        if not self._inside(path):
+            self.base.delete(path)
+            return
+        if path in self.written:
+            raise ValueError(f'アーカイブに書き込んだファイルは削除できません {path}')
+        self.deleted.add(path)
+
+    def close(self):
+        rest = [
+            p for p in sorted(self.root.rglob('*'))
+            if p.is_file() and p not in self.written and p not in self.deleted
+            and p != self.archive_path
+        ]
+        for path, data in prefetch_bytes(rest):
+            self._add(path, data)
+        self.archive.close()
+
+
 class File:
     site_root = None
     domain = ''
+    storage = FileSystemStorage()  # 読み書き先
+    check = False  # 書き込まずに更新が必要なファイルを記録するモード
+    changed = []  # チェックモードで更新が必要なファイル [(A|M|D, rel_path)]
+    preloaded = {}  # 比較用に先読みした現在の内容 (絶対パス -> bytes)
 
     def raise_error(self, msg):
         raise ValueError(f'{msg} {self.path}')
@@ -23,15 +197,127 @@ class File:
         self.rel_path = Path(self.rel_path ).as_posix()
         self.url = File.domain + self.rel_path
 
+    @staticmethod
+    def decode(data):
+        """
+        Path.read_text(encoding='utf8') と同じく改行を \\n に揃えて復号します
+        """
+        text = data.decode('utf8')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _key(self):
+        return Path(os.path.abspath(self.path))
+
+    def exists(self):
+        return File.storage.exists(self._key())
+
+    def read_bytes(self):
+        return File.storage.read_bytes(self._key())
+
+    def read_text(self):
+        return File.decode(self.read_bytes())
+
+    def mtime(self):
+        return File.storage.mtime(self._key())
+
+    @staticmethod
+    def preload(paths):
+        """
+        これから書き込むファイルの現在の内容をまとめて読んでおきます (比較用)
+        """
+        keys = [Path(os.path.abspath(path)) for path in paths]
+        File.preloaded.update(File.storage.read_many(keys))
+
+    def _current(self):
+        """
+        現在の内容を返します (なければ None)
+        """
+        key = self._key()
+        if key in File.preloaded:
+            return File.preloaded.pop(key)
+        if not File.storage.exists(key):
+            return None
+        return File.storage.read_bytes(key)
+
     def write_text(self, text):
-        if not self.path.parent.exists():
-            self.path.parent.mkdir(parents=True)
-        if self.path.exists():
-            current_text = self.path.read_text(encoding='utf8')
-            if current_text == text:
-                self.log(f'更新なし {self.rel_path}')
-                return
-            self.log(f'更新あり {self.rel_path}')
-        else:
+        data = text.encode('utf8')
+        current = self._current()
+        if current is None:
+            sign = 'A'
             self.log(f'新規作成 {self.rel_path}')
-        self.path.write_text(text, newline='\n', encoding='utf8')
+        elif File.decode(current) == text:  # CRLF のチェックアウトでも改行の違いは無視する
+            self.log(f'更新なし {self.rel_path}')
+            return
+        else:
+            sign = 'M'
+            self.log(f'更新あり {self.rel_path}')
+        if File.check:
+            if (sign, self.rel_path) not in File.changed:
+                File.changed.append((sign, self.rel_path))
+        File.storage.write_bytes(self._key(), data)
+
+    def unlink(self):
+        if not self.exists():
+            return
+        if File.check:
+            File.changed.append(('D', self.rel_path))
+        self.log(f'削除 {self.rel_path}')
+        File.storage.delete(self._key())
+
+    @staticmethod
+    def start_check():
+        """
+        チェックモードを開始します (書き込みは今の読み書き先に重ねたメモリに溜めます)
+        """
+        File.check = True
+        File.storage = MemoryStorage(base=File.storage)
+        File.changed = []
+
+    @staticmethod
+    def finish_check():
+        """
+        チェックモードを終了し、更新が必要なファイルを表示して返します
+        """
+        changed = File.changed
+        File.check = False
+        File.storage = File.storage.base
+        File.changed = []
+        for sign, rel_path in changed:
+            print(f'{sign} {rel_path}')
+        return changed
+
+
+def prefetch_bytes(paths, max_workers=4, max_bytes=64 * 1024 * 1024):
+    """
+    paths のファイルをスレッドプールで先読みし (path, bytes) を paths の順に返します
+    - 先読み中のファイル数は max_workers の 2 倍までとします
+    - 先読み中の合計バイト数は max_bytes までとします (1 ファイルで超える場合はそれのみ)
+    """
+    paths = iter(paths)
+    pending = deque()
+    in_flight = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            next_path = next(paths, None)
+            while next_path is not None or pending:
+                while next_path is not None and len(pending) < 2 * max_workers:
+                    size = next_path.stat().st_size
+                    if pending and in_flight + size > max_bytes:
+                        break
+                    future = executor.submit(next_path.read_bytes)
+                    pending.append((next_path, size, future))
+                    in_flight += size
+                    next_path = next(paths, None)
+                path, size, future = pending.popleft()
+                data = future.result()
+                in_flight -= size
+                yield path, data
+        finally:
+            for _, _, future in pending:
+                future.cancel()
@@ -0,0 +1,252 @@
+from cookies_site_utils.core import File
+from pathlib import Path
+import json
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+# funcs.js が描画するサイドバー等の要素 (HTML にはないがすべてのページで使う)
+SCRIPT_GENERATED = {
+    'a', 'div', 'h2', 'h5', 'p', 'span',
+    '.mode-btn', '.mode-container', '.index-link', '.logo', '.indent', '.top-link',
+    '#headers', '#mode-light-0', '#mode-light-1', '#mode-dark-0', '#mode-dark-1',
+}
+# 外部スクリプト (Prism, MathJax, Gist) が付けるクラス
+# これらのセレクタは未使用とはみなさず、クリティカルにも含めない
+DYNAMIC_PREFIXES = ('.token', '.MathJax', '.gist', '.blob-', '.pl-')
+NESTED_AT_RULES = ('@media', '@supports', '@layer', '@container')
+
+
+def _scan(text, pos, stops):
+    """
+    コメントと文字列を読み飛ばしながら stops のいずれかの文字の位置を探します
+    """
+    while pos < len(text):
+        c = text[pos]
+        if text.startswith('/*', pos):
+            end = text.find('*/', pos + 2)
+            pos = len(text) if end == -1 else end + 2
+            continue
+        if c in '"\'':
+            pos += 1
+            while pos < len(text) and text[pos] != c:
+                pos += 2 if text[pos] == '\\' else 1
+        elif c in stops:
+            return pos
+        pos += 1
+    return pos
+
+
+def _block_end(text, pos):
+    """
+    pos の開き括弧に対応する閉じ括弧の位置を返します
+    """
+    depth = 0
+    while pos < len(text):
+        pos = _scan(text, pos, '{}')
+        if pos >= len(text):
+            break
+        depth += 1 if text[pos] == '{' else -1
+        if depth == 0:
+            return pos
+        pos += 1
+    return pos
+
+
+def _strip_comments(text):
+    return re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL).strip()
+
+
+def parse_css(text):
+    """
+    スタイルシートを次の要素のリストにします
+    - ('statement', テキスト): @charset, @import など
+    - ('rule', セレクタ, 宣言): スタイルルール
+    - ('nested', 前置き, 子のリスト): @media など
+    - ('raw', 前置き, 本体): @font-face, @keyframes など (そのまま扱います)
+    """
+    nodes = []
+    pos = 0
+    while pos < len(text):
+        end = _scan(text, pos, '{;}')
+        prelude = _strip_comments(text[pos:end])
+        if end >= len(text):
+            break
+        if text[end] == ';':
+            if prelude:
+                nodes.append(('statement', prelude + ';'))
+            pos = end + 1
+            continue
+        if text[end] == '}':
+            pos = end + 1
+            continue
+        close = _block_end(text, end)
+        body = text[end + 1:close]
+        if prelude.startswith(NESTED_AT_RULES):
+            nodes.append(('nested', prelude, parse_css(body)))
+        elif prelude.startswith('@'):
+            nodes.append(('raw', prelude, body.strip()))
+        else:
+            nodes.append(('rule', prelude, _strip_comments(body)))
+        pos = close + 1
+    return nodes
+
+
+def split_selectors(selector_text):
+    selectors = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(selector_text):
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            selectors.append(selector_text[start:i].strip())
+            start = i + 1
+    selectors.append(selector_text[start:].strip())
+    return [s for s in selectors if s]
+
+
+def selector_tokens(selector):
+    """
+    セレクタが要求するタグ名・.クラス・#ID の集合です
+    (疑似クラス・疑似要素・属性セレクタは要求しないものとみなします)
+    """
+    selector = re.sub(r'\[[^\]]*\]', ' ', selector)
+    selector = re.sub(r'::?[\w-]+(\([^)]*\))?', '', selector)
+    tokens = set()
+    for compound in re.split(r'[\s>+~]+', selector):
+        m = re.match(r'[a-zA-Z][\w-]*', compound)
+        if m:
+            tokens.add(m.group(0).lower())
+        tokens.update(re.findall(r'[.#][\w-]+', compound))
+    return tokens
+
+
+def is_dynamic(tokens):
+    return any(t.startswith(DYNAMIC_PREFIXES) for t in tokens)
+
+
+def _render(nodes, keep):
+    """
+    keep(selector) が真のセレクタのみ残して直列化します
+    """
+    out = []
+    for node in nodes:
+        if node[0] == 'statement':
+            out.append(node[1])
+        elif node[0] == 'raw':
+            out.append(f'{node[1]}{{{node[2]}}}')
+        elif node[0] == 'nested':
+            inner = _render(node[2], keep)
+            if inner:
+                out.append(f'{node[1]}{{{inner}}}')
+        else:
+            selectors = [s for s in split_selectors(node[1]) if keep(s)]
+            if selectors:
+                out.append(f'{",".join(selectors)}{{{node[2]}}}')
+    return '\n'.join(out)
+
+
+def _iter_selectors(nodes):
+    for node in nodes:
+        if node[0] == 'nested':
+            yield from _iter_selectors(node[2])
+        elif node[0] == 'rule':
+            yield from split_selectors(node[1])
+
+
+def extract_critical(css_text, signatures):
+    """
+    ページ種別ごとのシグネチャ (ページで使われるタグ名・.クラス・#ID の集合) から
+    ページ種別ごとのクリティカル CSS と、どのページでも使われないセレクタを返します
+    """
+    nodes = parse_css(css_text)
+    critical = {}
+    for page_type, signature in signatures.items():
+        signature = set(signature) | SCRIPT_GENERATED
+
+        def keep(selector):
+            tokens = selector_tokens(selector)
+            return not is_dynamic(tokens) and tokens <= signature
+        critical[page_type] = _render(nodes, keep) + '\n'
+
+    all_tokens = set(SCRIPT_GENERATED)
+    for signature in signatures.values():
+        all_tokens |= signature
+    unused = []
+    for selector in _iter_selectors(nodes):
+        tokens = selector_tokens(selector)
+        if not is_dynamic(tokens) and not tokens <= all_tokens:
+            if selector not in unused:
+                unused.append(selector)
+    return critical, unused
+
+
+def critical_css(stylesheet_path, signatures, cache_path=''):
+    """
+    extract_critical の結果をスタイルシートのダイジェストとシグネチャのダイジェストを
+    キーにキャッシュします (cache_path を指定したとき)
+    """
+    css_text = Path(stylesheet_path).read_text(encoding='utf8')
+    css_digest = File.digest(css_text.encode('utf8'))
+    sig_digests = {
+        page_type: File.digest('\n'.join(sorted(signature)).encode('utf8'))
+        for page_type, signature in signatures.items()
+    }
+    key = css_digest + ':' + ':'.join(
+        f'{t}={d}' for t, d in sorted(sig_digests.items())
+    )
+    cache = {}
+    if cache_path and Path(cache_path).is_file():
+        cache = json.loads(Path(cache_path).read_text(encoding='utf8'))
+    if cache.get('key') == key:
+        critical, unused = cache['critical'], cache['unused']
+    else:
+        critical, unused = extract_critical(css_text, signatures)
+        if cache_path:
+            File(cache_path).write_text(json.dumps(
+                {'key': key, 'critical': critical, 'unused': unused},
+                ensure_ascii=False, indent=1,
+            ) + '\n')
+    for selector in unused:
+        logger.info(f'未使用のセレクタ {selector}')
+    return critical, unused
+
+
+_STYLESHEET_LINK = re.compile(
+    r'<link\b[^>]*\brel="stylesheet"[^>]*>', re.IGNORECASE,
+)
+
+
+def inline_critical(html_text, css, stylesheet_name='style.css'):
+    """
+    stylesheet_name へのリンクの直前にクリティカル CSS を埋め込み、
+    スタイルシート全体は非同期に読み込むようにします
+    """
+    m = next(
+        (m for m in _STYLESHEET_LINK.finditer(html_text) if stylesheet_name in m.group(0)),
+        None,
+    )  # 他のスタイルシートが先にあってもよい
+    if m is None:
+        return html_text
+    link = m.group(0)
+    preload = link.replace(
+        'rel="stylesheet"',
+        'as="style" onload="this.onload=null;this.rel=\'stylesheet\'" rel="preload"',
+    )
+    inlined = f'<style>{css.strip()}</style>{preload}<noscript>{link}</noscript>'
+    return html_text[:m.start()] + inlined + html_text[m.end():]
+
+
+def page_type(rel_path):
+    """
+    サイトルートからの相対パスからページ種別 (index, category, article) を返します
+    """
+    path = Path(rel_path)
+    if re.fullmatch(r'index(-\d+)?\.html', path.name):
+        return 'index'
+    if path.parent.name == 'categories':
+        return 'category'
+    return 'article'
@@ -0,0 +1,146 @@
+from cookies_site_utils.core import File, prefetch_bytes
+from bs4 import BeautifulSoup
+from pathlib import Path
+import random
+import json
+import re
+import zlib
+import logging
+logger = logging.getLogger(__name__)
+
+PRIME = 4294967311  # 2^32 より大きい素数 (a * x + b が uint64 に収まる)
+CHUNK = 4096  # NumPy で一度に処理するシングル数
+
+
+def visible_text(data):
+    """
+    記事本文 (div.item、なければ body) の表示されるテキストを空白を除いて返します
+    """
+    soup = BeautifulSoup(File.decode(data), 'html.parser')
+    root = soup.find('div', class_='item') or soup.body or soup
+    for tag in root.find_all(['script', 'style']):
+        tag.decompose()
+    return re.sub(r'\s+', '', root.get_text())
+
+
+def shingles(text, n=5):
+    """
+    文字 n-gram の 32 ビットハッシュの集合です
+    """
+    return {
+        zlib.crc32(text[i:i + n].encode('utf8'))
+        for i in range(max(len(text) - n + 1, 0))
+    }
+
+
+def hash_params(num_perm, seed=1):
+    rng = random.Random(seed)
+    return (
+        [rng.randrange(1, PRIME) for _ in range(num_perm)],
+        [rng.randrange(0, PRIME) for _ in range(num_perm)],
+    )
+
+
+def minhash(hashes, params):
+    """
+    MinHash シグネチャです (NumPy があればベクトル化し、なくても同じ値になります)
+    """
+    a, b = params
+    if not hashes:
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        return [min((ai * x + bi) % PRIME for x in hashes) for ai, bi in zip(a, b)]
+    x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    a = np.array(a, dtype=np.uint64)[:, None]
+    b = np.array(b, dtype=np.uint64)[:, None]
+    sig = np.full(len(a), PRIME, dtype=np.uint64)
+    for i in range(0, len(x), CHUNK):
+        sig = np.minimum(sig, ((a * x[None, i:i + CHUNK] + b) % PRIME).min(axis=1))
+    return [int(v) for v in sig]
+
+
+def similarity(sig_1, sig_2):
+    return sum(v1 == v2 for v1, v2 in zip(sig_1, sig_2)) / len(sig_1)
+
+
+def candidate_pairs(signatures, bands):
+    """
+    シグネチャを bands 個の帯に分け、どれかの帯が一致する組を返します
+    """
+    keys = sorted(signatures)
+    pairs = set()
+    if not keys:
+        return pairs
+    rows = len(signatures[keys[0]]) // bands
+    for band in range(bands):
+        buckets = {}
+        for key in keys:
+            sig = signatures[key][band * rows:(band + 1) * rows]
+            buckets.setdefault(tuple(sig), []).append(key)
+        for members in buckets.values():
+            for i, key_1 in enumerate(members):
+                for key_2 in members[i + 1:]:
+                    pairs.add((key_1, key_2))
+    return pairs
+
+
+def find_dupes(
+    paths, threshold=0.5, cache_path='', n=5, num_perm=128, bands=32, seed=1,
+):
+    """
+    ほぼ重複している記事の組を [(類似度の推定値, パス, パス)] (類似度の高い順) で返します
+    - 類似度は文字 n-gram 集合の Jaccard 係数の MinHash による推定値です
+    - シグネチャは内容のダイジェストごとに cache_path にキャッシュします
+    """
+    params = {'n': n, 'num_perm': num_perm, 'seed': seed}
+    cache = {}
+    if cache_path and Path(cache_path).is_file():
+        cache = json.loads(Path(cache_path).read_text(encoding='utf8'))
+        if cache.get('params') != params:
+            cache = {}
+    cached = cache.get('signatures', {})
+    hp = hash_params(num_perm, seed)
+
+    signatures = {}
+    used = {}
+    n_hashed = 0
+    for path, data in prefetch_bytes(paths):
+        digest = File.digest(data)
+        if digest not in cached:
+            cached[digest] = minhash(shingles(visible_text(data), n), hp)
+            n_hashed += 1
+        used[digest] = cached[digest]
+        if cached[digest] is not None:
+            signatures[path] = cached[digest]
+    logger.info(f'MinHash {n_hashed} 件 (キャッシュ {len(used) - n_hashed} 件)')
+    if cache_path:
+        Path(cache_path).write_text(
+            json.dumps({'params': params, 'signatures': used}) + '\n',
+            encoding='utf8', newline='\n',
+        )
+
+    result = []
+    for path_1, path_2 in candidate_pairs(signatures, bands):
+        sim = similarity(signatures[path_1], signatures[path_2])
+        if sim >= threshold:
+            result.append((sim, path_1, path_2))
+    result.sort(key=lambda r: (-r[0], str(r[1]), str(r[2])))
+    return result
+
+
+def format_dupes(dupes, site_root, fmt='text'):
+    rows = [
+        (round(sim, 3), Path(p1).relative_to(site_root).as_posix(),
+         Path(p2).relative_to(site_root).as_posix())
+        for sim, p1, p2 in dupes
+    ]
+    if fmt == 'json':
+        return json.dumps(
+            [{'similarity': s, 'paths': [p1, p2]} for s, p1, p2 in rows],
+            ensure_ascii=False, indent=2,
+        )
+    lines = [f'{s:.3f} {p1} {p2}' for s, p1, p2 in rows]
+    lines.append(f'{len(rows)} 組の重複候補があります')
+    return '\n'.join(lines)
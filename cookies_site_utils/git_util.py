@@ -0,0 +1,100 @@
+from cookies_site_utils.core import File
+from pathlib import Path
+from datetime import datetime
+import subprocess
+import json
+import time
+import os
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _git(args, cwd):
+    return subprocess.run(
+        ['git', '-c', 'core.quotePath=false', *args],
+        cwd=cwd, capture_output=True, text=True, encoding='utf8', check=True,
+    ).stdout
+
+
+def last_commit_dates(cwd):
+    """
+    cwd 以下のファイルの最終コミット日 {リポジトリルートからの相対パス: YYYY-MM-DD} を
+    git log 1 回で集めます (新しいコミットから見るので最初に出てきた日付が最終コミット日)
+    """
+    dates = {}
+    date = None
+    output = _git(
+        ['log', '--name-only', '--no-renames', '--format=format:\x01%cs', '--', '.'],
+        cwd,
+    )
+    for line in output.splitlines():
+        if line.startswith('\x01'):
+            date = line[1:]
+        elif line:
+            dates.setdefault(line, date)
+    return dates
+
+
+def dirty_paths(cwd):
+    """
+    cwd 以下の変更のあるファイル・追跡されていないファイル (リポジトリルートからの相対パス)
+    """
+    entries = iter(_git(
+        ['status', '--porcelain', '-z', '--untracked-files=all', '--', '.'], cwd,
+    ).split('\0'))
+    paths = set()
+    for entry in entries:
+        if not entry:
+            continue
+        paths.add(entry[3:])
+        if entry[0] in 'RC':  # 移動元・コピー元のパスが続く
+            next(entries, None)
+    return paths
+
+
+class GitTimestamps:
+    """
+    ページのタイムスタンプを git の最終コミット日にします (CI のチェックアウトでも揃います)
+    - 最終コミット日は git log 1 回で集め、HEAD ごとに cache_path にキャッシュします
+    - コミットされていない・変更のある・このビルドで書き込んだファイルは更新時刻にします
+    """
+    def __init__(self, site_root, cache_path=''):
+        self.site_root = Path(site_root).resolve()
+        self.cache_path = cache_path
+        self.started = time.time()
+        self.repo_root = None
+        self.dates = {}
+        self.dirty = set()
+        try:
+            self.repo_root, head = _git(
+                ['rev-parse', '--show-toplevel', 'HEAD'], self.site_root,
+            ).split()
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            logger.warning(f'git の履歴がないので更新時刻を使います {self.site_root}')
+            return
+        self.repo_root = Path(self.repo_root).resolve()
+        self.dirty = dirty_paths(self.site_root)
+        cache = {}
+        if cache_path and Path(cache_path).is_file():
+            cache = json.loads(Path(cache_path).read_text(encoding='utf8'))
+        if cache.get('head') == head:
+            self.dates = cache['dates']
+            return
+        logger.info('最終コミット日収集')
+        self.dates = last_commit_dates(self.site_root)
+        # キャッシュなので File を経由しない (チェックモードでは書かない)
+        if cache_path and not File.check:
+            Path(cache_path).write_text(
+                json.dumps({'head': head, 'dates': self.dates}, ensure_ascii=False)
+                + '\n', encoding='utf8', newline='\n',
+            )
+
+    def timestamp(self, path, mtime):
+        """
+        path の最終コミット日を返します (使えないときは mtime の日付)
+        """
+        if self.repo_root is not None and mtime < self.started:
+            rel = Path(os.path.abspath(path)).relative_to(self.repo_root).as_posix()
+            if rel in self.dates and rel not in self.dirty:
+                return self.dates[rel]
+        return datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
@@ -0,0 +1,58 @@
+from cookies_site_utils.builder import Page
+from cookies_site_utils.rules import validator
+import cookies_site_utils.soup_util as su
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import json
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+
+def lint_file(path, site_root, subsite_name=None, strict_check=True):
+    """
+    1 ファイルを検証し {'path': サイトルートからの相対パス, 'errors': [...]} を返します
+    """
+    page = Page(path, subsite_name, strict_check)
+    page.is_index = re.fullmatch(r'index(-\d+)?\.html', page.path.name) is not None
+    try:
+        soup, text = page.parse()
+        errors = []
+        if not su.is_redirect(text):
+            errors, _ = validator.validate(soup, page)
+    except Exception as e:
+        errors = [f'{type(e).__name__}: {e}']
+    return {'path': path.relative_to(site_root).as_posix(), 'errors': errors}
+
+
+def lint_site(site_root, subsite_name=None, strict_check=True, jobs=None):
+    """
+    サイトルート以下のすべての HTML ファイルをプロセスプールで検証します
+    jobs=1 のときはプロセスプールを使いません
+    """
+    site_root = Path(site_root).resolve()
+    paths = sorted(site_root.rglob('*.html'))
+    args = (
+        paths,
+        [site_root] * len(paths),
+        [subsite_name] * len(paths),
+        [strict_check] * len(paths),
+    )
+    if jobs == 1:
+        return list(map(lint_file, *args))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(lint_file, *args, chunksize=16))
+
+
+def format_results(results, fmt='text'):
+    if fmt == 'json':
+        return json.dumps(
+            [r for r in results if r['errors']], ensure_ascii=False, indent=2,
+        )
+    lines = []
+    for r in results:
+        for msg in r['errors']:
+            lines.append(f'{r["path"]}: {msg}')
+    n_files = sum(1 for r in results if r['errors'])
+    lines.append(f'{len(results)} ファイル中 {n_files} ファイルに違反があります')
+    return '\n'.join(lines)
@@ -0,0 +1,144 @@
+"""
+tracemalloc によるステージごとのメモリ計測です (build_index と ArticleHelper.run 用)
+計測していないときの stage() は何もしません
+"""
+from pathlib import Path
+import tracemalloc
+import platform
+import json
+import sys
+import os
+import logging
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+_active = None  # 計測中の MemoryProfile
+
+
+def _site(filename):
+    """
+    確保元のファイル名を sys.path からの相対パスにします (環境が違っても比べられるように)
+    """
+    for prefix in sorted((p for p in sys.path if p), key=len, reverse=True):
+        prefix = os.path.abspath(prefix)
+        if filename.startswith(prefix + os.sep):
+            return Path(os.path.relpath(filename, prefix)).as_posix()
+    return Path(filename).name
+
+
+class MemoryProfile:
+    """
+    ステージの境目ごとにスナップショットを取り、ステージ中のピークメモリと
+    前の境目から増えた確保元の上位 top 件を記録して report_path に JSON で書き出します
+    """
+    def __init__(self, report_path, top=10):
+        self.report_path = report_path
+        self.top = top
+        self.stages = []
+        self.snapshot = None
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+
+    def start(self):
+        global _active
+        tracemalloc.start()
+        self.snapshot = self._snapshot()
+        tracemalloc.reset_peak()
+        _active = self
+
+    def stage(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self._snapshot()
+        diffs = [
+            d for d in snapshot.compare_to(self.snapshot, 'lineno') if d.size_diff > 0
+        ]
+        diffs.sort(key=lambda d: -d.size_diff)
+        self.stages.append({
+            'name': name,
+            'current': current,
+            'peak': peak,
+            'top': [
+                {
+                    'site': f'{_site(d.traceback[0].filename)}:{d.traceback[0].lineno}',
+                    'size': d.size_diff,
+                    'count': d.count_diff,
+                }
+                for d in diffs[:self.top]
+            ],
+        })
+        logger.info(f'メモリ {name}: 現在 {current:,} バイト, ピーク {peak:,} バイト')
+        self.snapshot = snapshot
+        tracemalloc.reset_peak()  # ピークは計測の負荷を含まないようスナップショットの後から
+
+    def finish(self, name='finish'):
+        global _active
+        if _active is not self:
+            return
+        self.stage(name)
+        _active = None
+        tracemalloc.stop()
+        report = {
+            'version': VERSION,
+            'python': platform.python_version(),
+            'peak': max(s['peak'] for s in self.stages),
+            'stages': self.stages,
+        }
+        Path(self.report_path).write_text(
+            json.dumps(report, ensure_ascii=False, indent=1) + '\n',
+            encoding='utf8', newline='\n',
+        )
+        return report
+
+
+def start(report_path, top=10):
+    """
+    report_path が空でなければ計測を始めて MemoryProfile を返します
+    """
+    if not report_path:
+        return None
+    profile = MemoryProfile(report_path, top)
+    profile.start()
+    return profile
+
+
+def stage(name):
+    """
+    ステージ name の終わりを記録します (計測中でなければ何もしません)
+    """
+    if _active is not None:
+        _active.stage(name)
+
+
+def compare_reports(old, new, tolerance=0.1):
+    """
+    2 つのレポートの同じ名前のステージのピークを比べ、
+    tolerance の割合を超えて増えたものを [(ステージ名, 前のピーク, 今のピーク)] で返します
+    """
+    old_peaks = {s['name']: s['peak'] for s in old['stages']}
+    regressions = []
+    for s in new['stages']:
+        before = old_peaks.get(s['name'])
+        if before is not None and s['peak'] > before * (1 + tolerance):
+            regressions.append((s['name'], before, s['peak']))
+    return regressions
+
+
+def format_comparison(old, new, tolerance=0.1):
+    """
+    ステージごとのピークの比較表です (tolerance を超えて増えたステージに ! を付けます)
+    """
+    old_peaks = {s['name']: s['peak'] for s in old['stages']}
+    regressed = {name for name, _, _ in compare_reports(old, new, tolerance)}
+    lines = []
+    for s in new['stages']:
+        before = old_peaks.get(s['name'])
+        ratio = f'{s["peak"] / before:.2f}x' if before else '-'
+        mark = '!' if s['name'] in regressed else ' '
+        before = f'{before:,}' if before is not None else '-'
+        lines.append(f'{mark} {s["name"]} {before} -> {s["peak"]:,} ({ratio})')
+    lines.append(f'{len(regressed)} ステージでピークが {tolerance:.0%} を超えて増えました')
+    return '\n'.join(lines)
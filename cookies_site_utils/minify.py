@@ -0,0 +1,170 @@
+from cookies_site_utils.core import File
+from cookies_site_utils.css_util import inline_critical, page_type
+from cookies_site_utils.resources import use_bundle, bundle_name
+from pathlib import Path
+import json
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+VERSION = 1  # 変更すると公開先のファイルはすべて作り直されます
+
+_PRESERVED = re.compile(
+    r'(<(pre|code|textarea|script|style)\b.*?</\2\s*>)',
+    re.DOTALL | re.IGNORECASE,
+)
+_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+_BLOCK_TAGS = (
+    'html|head|body|meta|link|title|base|script|style|noscript|'
+    'div|main|nav|header|footer|section|article|aside|figure|figcaption|'
+    'p|ul|ol|li|dl|dt|dd|h[1-6]|table|thead|tbody|tfoot|tr|th|td|'
+    'blockquote|pre|form|hr|br|details|summary|!doctype'
+)
+_AROUND_BLOCK = re.compile(
+    rf'\s*(</?(?:{_BLOCK_TAGS})\b[^>]*>)\s*', re.IGNORECASE,
+)
+
+
+def minify_html(text):
+    """
+    タグ間の空白をつぶします
+    - pre, code, textarea, script, style の中身はそのままにします
+    - インライン要素間の空白は 1 つの空白にします (ブロック要素の前後のみ除きます)
+    """
+    parts = _PRESERVED.split(_COMMENT.sub('', text))
+    result = []
+    for i in range(0, len(parts), 3):
+        seg = re.sub(r'\s+', ' ', parts[i])
+        result.append(_AROUND_BLOCK.sub(r'\1', seg))
+        if i + 1 < len(parts):
+            result.append(parts[i + 1])
+    text = ''.join(result)
+    # 保護したブロック要素の前後の空白
+    text = re.sub(
+        r'\s+(<(?:pre|script|style|textarea)\b)', r'\1', text, flags=re.IGNORECASE,
+    )
+    text = re.sub(
+        r'(</(?:pre|script|style|textarea)\s*>)\s+', r'\1', text, flags=re.IGNORECASE,
+    )
+    return text.strip() + '\n'
+
+
+_CSS_TOKEN = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.DOTALL,
+)
+
+
+def minify_css(text):
+    """
+    コメントを除き、空白をつぶします (文字列の中身はそのままにします)
+    """
+    result = []
+    pos = 0
+    for m in _CSS_TOKEN.finditer(text):
+        result.append(_minify_css_code(text[pos:m.start()]))
+        if m.group(1):
+            result.append(m.group(1))
+        pos = m.end()
+    result.append(_minify_css_code(text[pos:]))
+    return ''.join(result).strip() + '\n'
+
+
+def _minify_css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+    code = re.sub(r':\s+', ':', code)
+    return code.replace(';}', '}')
+
+
+def minify_js(text):
+    """
+    行頭と行末の空白、空行、行コメントのみの行を除きます
+    (改行は自動セミコロン挿入のため残します、複数行のテンプレートリテラルの中はそのままにします)
+    """
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if not in_template:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        else:
+            lines.append(line)
+        if len(re.findall(r'(?<!\\)`', line)) % 2 == 1:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.html': minify_html,
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def publish(
+    site_root, out_dir, manifest_name='.publish.json', critical_css=None,
+    js_bundles=False,
+):
+    """
+    サイトルート以下のファイルを HTML, CSS, JS は縮小して、それ以外はそのまま
+    out_dir に書き出します
+    - 前回書き出したときのソースのダイジェストを out_dir の manifest_name に記録し、
+      ダイジェストが変わらないファイルは書き出しません
+    - ソースからなくなったファイルは out_dir から削除します
+    - critical_css (ページ種別 -> クリティカル CSS) を渡すと HTML の head に埋め込み、
+      style.css は非同期に読み込むようにします
+    - js_bundles=True にすると HTML の funcs.js の参照をページ種別ごとのバンドル
+      (build_index(js_bundles=True) で書き出したもの) の参照にします
+      (サイトルートにバンドルがなければ例外になります)
+    """
+    site_root = Path(site_root)
+    out_dir = Path(out_dir)
+    manifest_path = out_dir / manifest_name
+    manifest = {}
+    if manifest_path.is_file():
+        manifest = json.loads(manifest_path.read_text(encoding='utf8'))
+        if manifest.get('version') != VERSION:
+            manifest = {}
+    digests = manifest.get('files', {})
+    new_digests = {}
+    n_written = 0
+    for src in sorted(site_root.rglob('*')):
+        if not src.is_file():
+            continue
+        rel = src.relative_to(site_root).as_posix()
+        dst = out_dir / rel
+        data = src.read_bytes()
+        css = None
+        if critical_css is not None and src.suffix == '.html':
+            css = critical_css.get(page_type(rel))
+        digest = File.digest(
+            data + (css or '').encode('utf8') + (b'\0js' if js_bundles else b''),
+        )
+        new_digests[rel] = digest
+        if digests.get(rel) == digest and dst.is_file():
+            continue
+        minifier = MINIFIERS.get(src.suffix)
+        if minifier is not None:
+            text = minifier(File.decode(data))
+            if css is not None:
+                text = inline_critical(text, minify_css(css).strip())
+            if js_bundles and src.suffix == '.html':
+                bundled = use_bundle(text, page_type(rel))
+                bundle = site_root / bundle_name(page_type(rel))
+                if bundled != text and not bundle.is_file():
+                    raise ValueError(f'バンドルがありません {bundle}')
+                text = bundled
+            data = text.encode('utf8')
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        dst.write_bytes(data)
+        n_written += 1
+    for rel in set(digests) - set(new_digests):
+        (out_dir / rel).unlink(missing_ok=True)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(
+        json.dumps({'version': VERSION, 'files': new_digests}, indent=1) + '\n',
+        encoding='utf8', newline='\n',
+    )
+    logger.info(f'公開先に書き出し {n_written} / {len(new_digests)} ファイル')
+    return n_written
@@ -0,0 +1,96 @@
+from cookies_site_utils.core import File
+import heapq
+import json
+import math
+import logging
+logger = logging.getLogger(__name__)
+
+SUBCAT_WEIGHT = 1.0  # 同じサブカテゴリに属するときに加える重み (カテゴリの重みに対する倍率)
+
+
+def category_memberships(all_cats):
+    """
+    カテゴリ名 -> [(記事の相対パス, サブカテゴリ)] (相対パス順) の転置インデックスです
+    """
+    memberships = {}
+    for cat in all_cats:
+        members = [(a.rel_path, None) for a in cat.articles]
+        with_subcat = cat.articles_with_subcat
+        if isinstance(with_subcat, dict):
+            with_subcat = with_subcat.items()
+        for subcat, articles in with_subcat:
+            members += [(a.rel_path, subcat) for a in articles]
+        memberships[cat.cat_name] = sorted(members, key=lambda m: (m[0], m[1] or ''))
+    return memberships
+
+
+def _weight(n_members):
+    # 小さいカテゴリを共有するほど関連が強いとみなす
+    return 1.0 / math.log2(1 + n_members)
+
+
+def related_articles(memberships, targets, k=5):
+    """
+    targets の各記事について、カテゴリを共有する記事を重みの合計が大きい順に k 件返します
+    計算量は targets が属するカテゴリの大きさの和に比例します
+    """
+    cats_of = {}
+    for cat_name, members in memberships.items():
+        for rel_path, subcat in members:
+            cats_of.setdefault(rel_path, []).append((cat_name, subcat))
+    result = {}
+    for target in targets:
+        scores = {}
+        for cat_name, subcat in cats_of.get(target, []):
+            members = memberships[cat_name]
+            w = _weight(len(members))
+            for rel_path, other_subcat in members:
+                if rel_path == target:
+                    continue
+                score = w
+                if subcat is not None and subcat == other_subcat:
+                    score += w * SUBCAT_WEIGHT
+                scores[rel_path] = scores.get(rel_path, 0.0) + score
+        result[target] = [
+            [rel_path, round(score, 4)] for rel_path, score in heapq.nsmallest(
+                k, scores.items(), key=lambda x: (-x[1], x[0]),
+            )
+        ]
+    return result
+
+
+def write_related(index_page, sidecar_path, k=5):
+    """
+    目次ページの記事ごとの関連記事を JSON で書き出します
+    前回の出力と比べて所属記事が変わったカテゴリの記事のみ計算し直します
+    """
+    memberships = {
+        cat_name: [list(m) for m in members]
+        for cat_name, members in category_memberships(index_page.all_cats).items()
+    }
+    sidecar = File(sidecar_path)
+    previous = {}
+    if sidecar.exists():
+        previous = json.loads(sidecar.read_text())
+        if previous.get('k') != k:
+            previous = {}
+    prev_memberships = previous.get('memberships', {})
+    related = previous.get('related', {})
+
+    all_articles = {a.rel_path for a in index_page.articles}
+    targets = set(all_articles - set(related))
+    for cat_name in set(memberships) | set(prev_memberships):
+        if memberships.get(cat_name) != prev_memberships.get(cat_name):
+            for members in [memberships.get(cat_name), prev_memberships.get(cat_name)]:
+                targets.update(m[0] for m in members or [])
+    targets &= all_articles
+    logger.info(f'関連記事 {len(targets)} / {len(all_articles)} 記事を計算')
+    related.update(related_articles(
+        {c: [tuple(m) for m in ms] for c, ms in memberships.items()}, targets, k,
+    ))
+    related = {r: related[r] for r in sorted(all_articles)}
+    sidecar.write_text(json.dumps(
+        {'k': k, 'memberships': memberships, 'related': related},
+        ensure_ascii=False, separators=(',', ':'), sort_keys=True,
+    ) + '\n')
+    return related
@@ -1,8 +1,102 @@
 from cookies_site_utils.core import File
+from pathlib import Path
 import importlib.resources
+import json
+import re
+import logging
+logger = logging.getLogger(__name__)
+
+# funcs.js を構成するモジュール (この順に連結します) と、そのモジュールが必要になる
+# ページのシグネチャ (いずれかを含むページ種別のバンドルに入れます、None はすべて)
+JS_MODULES = {
+    'sidebar': None,
+    'buttons': None,
+    'loader': (
+        '[data-prism]', '[data-prism-bash]', '[data-prism-latex]',
+        '[data-prism-python]', '[data-prism-sql]', '[data-prism-toml]',
+        '[data-mathjax]',
+    ),
+    'links': None,
+    'refs': ('.ref', '.footnote'),
+    'images': ('figure',),
+    'main': None,
+}
+
+
+def _resource_path():
+    return importlib.resources.files('cookies_site_utils') / 'resources'
+
+
+def js_module(name):
+    return (_resource_path() / 'js' / f'{name}.js').read_text(encoding='utf-8')
+
+
+def js_bundle(names=JS_MODULES):
+    return '\n'.join(js_module(name) for name in names)
 
 
 def sync_resource(target_path):
-    resource_path = importlib.resources.files('cookies_site_utils') / 'resources'
-    src = (resource_path / target_path.name).read_text(encoding='utf-8')
+    if target_path.name == 'funcs.js':  # すべてのモジュールを連結したもの
+        src = js_bundle()
+    else:
+        src = (_resource_path() / target_path.name).read_text(encoding='utf-8')
     File(target_path, verbose=True).write_text(src)
+
+
+def bundle_name(page_type):
+    return f'funcs-{page_type}.js'
+
+
+def modules_for(signature):
+    """
+    シグネチャ (ページで使われるタグ名・.クラス・#ID・スクリプトの [data-*]) の
+    ページに必要なモジュールです
+    """
+    return [
+        name for name, needs in JS_MODULES.items()
+        if needs is None or any(s in signature for s in needs)
+    ]
+
+
+def use_bundle(html_text, page_type):
+    """
+    ページの funcs.js の参照をページ種別ごとのバンドルの参照にします (クエリは残します)
+    """
+    return re.sub(
+        r'(<script\b[^>]*\bsrc="[^"]*?)\bfuncs\.js\b',
+        rf'\1{bundle_name(page_type)}', html_text,
+    )
+
+
+def sync_bundles(js_dir, signatures, manifest_path=''):
+    """
+    ページ種別ごとに必要なモジュールのみ連結したバンドル funcs-<種別>.js を書き出し、
+    サイズを表示して {ページ種別: (バイト数, funcs.js のバイト数)} を返します
+    signatures は build_index(collect_signatures=True) で集めた Page.signatures です
+    モジュールの組と内容が manifest_path に記録したものと同じバンドルは書き直しません
+    """
+    js_dir = Path(js_dir)
+    manifest = {}
+    if manifest_path and Path(manifest_path).is_file():
+        manifest = json.loads(Path(manifest_path).read_text(encoding='utf8'))
+    full_size = len(js_bundle().encode('utf8'))
+    sizes = {}
+    for page_type, signature in sorted(signatures.items()):
+        names = modules_for(signature)
+        src = js_bundle(names)
+        digest = File.digest(src.encode('utf8'))
+        target = File(js_dir / bundle_name(page_type), verbose=True)
+        if manifest.get(page_type) != digest or not target.exists():
+            target.write_text(src)
+            manifest[page_type] = digest
+        sizes[page_type] = (len(src.encode('utf8')), full_size)
+        logger.info(
+            f'{bundle_name(page_type)} {sizes[page_type][0]} バイト '
+            f'(funcs.js の {sizes[page_type][0] / full_size:.0%}) {", ".join(names)}'
+        )
+    # キャッシュなので File を経由しない (チェックモードでは書かない)
+    if manifest_path and not File.check:
+        Path(manifest_path).write_text(
+            json.dumps(manifest, sort_keys=True) + '\n', encoding='utf8', newline='\n',
+        )
+    return sizes
@@ -0,0 +1,13 @@
+function setButton(id, handle) {
+  let button = document.getElementById(id);
+  button.addEventListener('click', handle);
+  button.addEventListener('touchstart', handle);
+}
+
+function setButtonOpenClose(id0, id1) {
+  let target = document.getElementById(id1);
+  target.style.display = 'none';
+  setButton(id0, () => {
+    target.style.display = (target.style.display === 'none') ? 'block' : 'none';
+  });
+}
@@ -0,0 +1,10 @@
+function linkImages() {
+  document.querySelectorAll('figure > img').forEach(img => {
+    const a = document.createElement('a');
+    a.href = img.src;
+    a.target = '_blank';
+    a.rel = 'noopener';
+    img.parentNode.insertBefore(a, img);
+    a.appendChild(img);
+  });
+}
@@ -0,0 +1,16 @@
+function secureExternalLinks(root = document) {
+  const originHost = location.host;
+  root.querySelectorAll('a[href]').forEach((a) => {
+    const href = a.getAttribute('href');
+    if (!href) return;
+    if (href.startsWith('#') || href.startsWith('mailto:')) return;
+    const url = new URL(href, location.href);
+    if (url.host === originHost) return;
+    a.setAttribute('target', '_blank');
+    const rel = (a.getAttribute('rel') || '').split(/\s+/);
+    ['noopener', 'noreferrer'].forEach(v => {
+      if (!rel.includes(v)) rel.push(v);
+    });
+    a.setAttribute('rel', rel.filter(Boolean).join(' '));
+  });
+}
@@ -0,0 +1,35 @@
+function init(repo, isIndex = false, isTop = false, lang = 'ja') {
+  createSidebar(repo, isIndex, isTop, lang);
+  secureExternalLinks();
+  // ページ種別ごとのバンドルには必要なモジュールしか含まれない
+  if (typeof linkRefs === 'function') linkRefs();
+  if (typeof linkFootnotes === 'function') linkFootnotes();
+  if (typeof linkImages === 'function') linkImages();
+}
+
+document.addEventListener('DOMContentLoaded', async () => {
+  const s = document.getElementById('app');
+
+  const prismLangs = new Set();
+  if (s?.dataset.prism === 'true') prismLangs.add('');
+  if (s?.dataset.prismBash === 'true') prismLangs.add('bash');
+  if (s?.dataset.prismLatex === 'true') prismLangs.add('latex');
+  if (s?.dataset.prismPython === 'true') prismLangs.add('python');
+  if (s?.dataset.prismSql === 'true') prismLangs.add('sql');
+  if (s?.dataset.prismToml === 'true') prismLangs.add('toml');
+  if (prismLangs.size > 0 && typeof loadPrism === 'function') {
+    await loadPrism(prismLangs);
+    installPrismHooks();
+    Prism.highlightAll();
+  }
+
+  if (s?.dataset.mathjax === 'true' && typeof loadMathJax === 'function') {
+    await loadMathJax();
+  }
+
+  const repo = s?.dataset.repo || 'cookie-box';
+  const isIndex = s?.dataset.isIndex === 'true';
+  const linkTop = s?.dataset.linkTop === 'true';
+  const lang = s?.dataset.lang || 'ja';
+  init(repo, isIndex, linkTop, lang);
+});
@@ -0,0 +1,83 @@
+function setModeButton(localStorageKeyName, elmId, mode) {
+  document.getElementById(elmId).addEventListener('click', () => {
+    document.documentElement.setAttribute('data-mode', mode);
+    localStorage.setItem(localStorageKeyName, mode);
+  });
+}
+
+function createModeButtons(i, lang) {
+  let btns = '<div class="mode-container">';
+  btns += (lang === 'ja') ? '配色切替' : 'Light/Dark';
+  btns += `<div id="mode-light-${i}" class="mode-btn"></div>`;
+  btns += `<div id="mode-dark-${i}" class="mode-btn"></div>`;
+  btns += '</div>';
+  return btns;
+}
+
+function renderSidebar(repo, isIndex, linkTop, lang) {
+  let indexUrl = isIndex ? 'index.html' : '../index.html';
+  let toIndex = `<a class="index-link" href="${indexUrl}"></a>`;
+  let gitHub = `<a href="https://github.com/CookieBox26/${repo}/issues">Issues</a>`;
+
+  let spHeaderLeft = isIndex ? '<span></span>' : toIndex;
+  let modeButtons0 = createModeButtons(0, lang);
+  let modeButtons1 = createModeButtons(1, lang);
+  document.getElementById('smartphone-header').innerHTML += spHeaderLeft + modeButtons0;
+
+  let content = '';
+  content += `<h2 class="logo">${toIndex}</h2>`;
+  content += `<p>${modeButtons1}</p>`;
+  content += isIndex ? '' : `<p>ご指摘等は ${gitHub} までご連絡ください</p>`;
+  content += isIndex ? '' : '<p><a href="#">ページの一番上に戻る</a></p>';
+
+  const allHeaders = document.querySelectorAll('h2, h3');
+  if (allHeaders.length > 0) {
+    let index = '<h5>ページ内の小見出し一覧</h5>';
+    for (let i = 0; i < allHeaders.length; ++i) {
+      index += '<p class="';
+      if (allHeaders[i].tagName === 'H3') {
+        index += 'indent';
+      }
+      index += '">';
+      index += '<a href="#head' + String(i) + '">';
+      index += allHeaders[i].textContent + '</a></p>';
+      allHeaders[i].innerHTML += '<a id="head' + String(i) + '"></a>';
+    }
+    content += `<div id="headers">${index}</div>`;
+  }
+
+  if (isIndex) {
+    let div = document.createElement('div');
+    div.innerHTML = content;
+    let ref = document.getElementById('bookmark');
+    document.getElementById('sidebar').insertBefore(div, ref);
+  } else {
+    document.getElementById('sidebar').innerHTML += content;
+  }
+  if (linkTop) {
+    let topUrl = isIndex ? '../index.html' : '../../index.html';
+    let toTop = `From&nbsp;<a class="top-link" href="${topUrl}"></a>`;
+    let toTopDiv = `<div class="top-link">${toTop}</div>`;
+    document.getElementById('sidebar').innerHTML += toTopDiv;
+    const footer = document.getElementById('smartphone-footer');
+    if (footer) {
+      footer.innerHTML += toTop;
+    }
+  }
+}
+
+function createSidebar(repo = 'cookie-box', isIndex = false, linkTop = false, lang = 'ja') {
+  let localStorageKeyName = (repo === 'cookie-box') ? 'mode' : `mode-${repo}`;
+  // ビルド時に描画済み (data-prerendered) ならイベントハンドラの設定のみ行う
+  if (document.getElementById('sidebar').dataset.prerendered !== 'true') {
+    renderSidebar(repo, isIndex, linkTop, lang);
+  }
+
+  document.documentElement.setAttribute('data-mode', 'light');
+  const saved = localStorage.getItem(localStorageKeyName);
+  if (saved) document.documentElement.setAttribute('data-mode', saved);
+  for (let i = 0; i < 2; ++i) {
+    setModeButton(localStorageKeyName, `mode-light-${i}`, 'light');
+    setModeButton(localStorageKeyName, `mode-dark-${i}`, 'dark');
+  }
+}
@@ -0,0 +1,94 @@
+class Validator:
+    """
+    ページの検証規則をタグ名ごとに登録し、1 回の走査ですべて評価します
+    - rule(*names) で登録する関数は (tag, ctx) を受け取り違反メッセージか None を返します
+    - names を省略した規則はすべてのタグで評価します
+    - finalizer で登録する関数は走査後に ctx を受け取り違反メッセージのリストを返します
+    - ctx は 1 ページの評価中に共有される辞書で ctx['page'] が評価対象のページです
+      signature を渡したときは ctx['signature'] にページで使われるタグ名・.クラス・#ID を集めます
+    """
+    def __init__(self):
+        self.rules = {}  # タグ名 (すべてのタグは None) -> [(規則, strict)]
+        self.finalizers = []
+
+    def rule(self, *names, strict=False):
+        """
+        strict=True の規則は page.strict_check のときのみ評価します
+        """
+        def register(f):
+            for name in (names or [None]):
+                self.rules.setdefault(name, []).append((f, strict))
+            return f
+        return register
+
+    def finalizer(self, f):
+        self.finalizers.append(f)
+        return f
+
+    def validate(self, soup, page, signature=None):
+        """
+        違反メッセージのリストと ctx を返します
+        """
+        ctx = {'page': page, 'signature': signature}
+        errors = []
+        any_rules = self.rules.get(None, [])
+        for tag in soup.find_all(True):
+            for f, strict in self.rules.get(tag.name, []) + any_rules:
+                if strict and not page.strict_check:
+                    continue
+                msg = f(tag, ctx)
+                if msg is not None and msg not in errors:
+                    errors.append(msg)
+        for f in self.finalizers:
+            errors += f(ctx)
+        return errors, ctx
+
+
+validator = Validator()
+
+
+@validator.rule('title', 'h1')
+def _first_title_and_h1(tag, ctx):
+    ctx.setdefault(tag.name, tag.get_text())
+
+
+@validator.rule()
+def _collect_signature(tag, ctx):
+    signature = ctx['signature']
+    if signature is None:
+        return
+    signature.add(tag.name)
+    signature.update('.' + c for c in tag.get('class', []))
+    if tag.has_attr('id'):
+        signature.add('#' + tag['id'])
+    if tag.name == 'script':  # funcs.js のモジュール選択用
+        signature.update(f'[{a}]' for a in tag.attrs if a.startswith('data-'))
+
+
+@validator.rule(strict=True)
+def _no_inline_style(tag, ctx):
+    if tag.has_attr('style'):
+        return 'インラインスタイルがある'
+
+
+@validator.rule('a', strict=True)
+def _no_target(tag, ctx):
+    if tag.has_attr('target'):
+        return 'a タグに target 属性がある'
+
+
+@validator.finalizer
+def _title_is_h1_and_subsite_name(ctx):
+    page = ctx['page']
+    if 'h1' not in ctx:
+        return ['h1 タグがない']
+    if page.subsite_name is None:
+        return []
+    page_title = ctx.get('title')
+    if page.is_index:
+        if page_title != f'{page.subsite_name}':
+            return ['title タグがサブサイト名でない']
+    else:
+        if page_title != f'{ctx["h1"]} - {page.subsite_name}':
+            return ['title タグが h1 タグ + サブサイト名でない']
+    return []
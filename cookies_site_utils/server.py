@@ -0,0 +1,173 @@
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, unquote
+import threading
+import hashlib
+import mimetypes
+import gzip
+import logging
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class ResponseCache:
+    """
+    サイトのファイルを (mtime, size) で無効化する LRU キャッシュです
+    gzip 版は初めて要求されたときに作ります
+    """
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.entries = OrderedDict()  # path -> entry
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry['key'] == key:
+                self.entries.move_to_end(path)
+                return entry
+        body = path.read_bytes()
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type.endswith('javascript'):
+            content_type += '; charset=utf-8'
+        entry = {
+            'key': key,
+            'body': body,
+            'etag': '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            'content_type': content_type,
+            'gzip': None,
+        }
+        with self.lock:
+            self._pop(path)
+            self.entries[path] = entry
+            self.n_bytes += len(body)
+            while self.n_bytes > self.max_bytes and len(self.entries) > 1:
+                self._pop(next(iter(self.entries)))
+        return entry
+
+    def get_gzip(self, path, entry):
+        if entry['gzip'] is not None:
+            return entry['gzip']
+        gz = gzip.compress(entry['body'], mtime=0)
+        with self.lock:
+            if entry['gzip'] is None:  # 同時に圧縮したときは先に入れたものを使う
+                entry['gzip'] = gz
+                if self.entries.get(path) is entry:  # 追い出されたエントリは数えない
+                    self.n_bytes += len(gz)
+                    while self.n_bytes > self.max_bytes and len(self.entries) > 1:
+                        self._pop(next(iter(self.entries)))
+            return entry['gzip']
+
+    def _pop(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.n_bytes -= len(entry['body']) + len(entry['gzip'] or b'')
+
+
+class SiteRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'csu'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _resolve(self):
+        """
+        (配信するファイルのパス, リダイレクト先) を返します (なければパスは None)
+        """
+        root = self.server.site_root
+        parts = urlsplit(self.path)
+        rel = unquote(parts.path).lstrip('/')
+        path = (root / rel).resolve()
+        if not path.is_relative_to(root):
+            return None, None
+        if path.is_dir():
+            if not parts.path.endswith('/'):  # 相対リンクの基準がずれないように
+                return None, urlunsplit(('', '', parts.path + '/', parts.query, ''))
+            path = path / 'index.html'
+        return (path if path.is_file() else None), None
+
+    def _respond(self, with_body):
+        path, location = self._resolve()
+        if location is not None:
+            self.send_response(301)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if path is None:
+            self.send_error(404)
+            return
+        cache = self.server.cache
+        entry = cache.get(path)
+        use_gzip = (
+            'gzip' in self.headers.get('Accept-Encoding', '')
+            and entry['content_type'].startswith(COMPRESSIBLE)
+        )
+        etag = entry['etag'][:-1] + '-gz"' if use_gzip else entry['etag']
+        if_none_match = self.headers.get('If-None-Match', '')
+        if etag in [t.strip() for t in if_none_match.split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = cache.get_gzip(path, entry) if use_gzip else entry['body']
+        self.send_response(200)
+        self.send_header('Content-Type', entry['content_type'])
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+
+class SiteServer(HTTPServer):
+    """
+    リクエストをスレッドプールで処理するプレビュー用サーバです
+    """
+    def __init__(
+        self, address, site_root, max_workers=16, cache_max_bytes=128 * 1024 * 1024,
+    ):
+        super().__init__(address, SiteRequestHandler)
+        self.site_root = Path(site_root).resolve()
+        self.cache = ResponseCache(cache_max_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def serve(site_root, host='127.0.0.1', port=8000, max_workers=16):
+    with SiteServer((host, port), site_root, max_workers) as server:
+        logger.info(f'http://{host}:{server.server_port}/ で {server.site_root} を配信します')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
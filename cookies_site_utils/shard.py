@@ -0,0 +1,181 @@
+from cookies_site_utils.core import File, prefetch_bytes
+from cookies_site_utils.builder import (
+    Page, ArticlePage, IndexPage, PageRecord, register_categories,
+    entry_memberships, restore_signature, collecting_errors,
+)
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+import tempfile
+import json
+import os
+import zlib
+import logging
+logger = logging.getLogger(__name__)
+
+
+def shard_of(rel_path, n_shards):
+    return zlib.crc32(rel_path.encode('utf8')) % n_shards
+
+
+def shard_paths(subsite_root, shard, n_shards):
+    """
+    サブサイトの記事ページのうちシャード shard に属するものを返します
+    (build_index のコンテクスト内で呼んでください)
+    """
+    paths = sorted((Path(subsite_root) / 'articles').glob('*.html'))
+    return [p for p in paths if shard_of(File(p).rel_path, n_shards) == shard]
+
+
+def build_state(subsite_name, rel_paths=None):
+    """
+    シャードに渡すビルド設定です (rel_paths を渡すとページ更新日はそのページのみ渡します)
+    """
+    last_counts = Page.last_counts
+    if last_counts is not None and rel_paths is not None:
+        last_counts = {r: last_counts[r] for r in rel_paths if r in last_counts}
+    return {
+        'site_root': Path(File.site_root).resolve(),
+        'domain': File.domain,
+        'force_keep_timestamp': Page.force_keep_timestamp,
+        'timestamp_provider': Page.timestamp_provider,
+        'last_counts': last_counts,
+        'subsite_name': subsite_name,
+        'keep_going': Page.errors is not None,
+        'collect_signatures': Page.signatures is not None,
+    }
+
+
+def build_shard(article_paths, manifest_path, state):
+    """
+    記事ページを評価し、部分マニフェスト (記事の記録・所属カテゴリ・ページ更新日・
+    シグネチャ・集めたエラー) を manifest_path に JSON で書き出します
+    記事の記録はチェックポイントの評価結果と同じ形なのでそのままチェックポイントにできます
+    カテゴリページパスはサイトルートからの相対パスで書くので別のマシンでも結合できます
+    """
+    File.site_root = state['site_root']
+    File.domain = state['domain']
+    Page.force_keep_timestamp = state['force_keep_timestamp']
+    Page.timestamp_provider = state['timestamp_provider']
+    Page.last_counts = state['last_counts']
+    Page.errors = [] if state['keep_going'] else None
+    Page.signatures = {} if state['collect_signatures'] else None
+    articles = []
+    for path, data in prefetch_bytes(
+        article_paths,
+        IndexPage.prefetch_workers,
+        IndexPage.prefetch_max_bytes,
+    ):
+        with collecting_errors():
+            article = ArticlePage(path, state['subsite_name'])
+            soup = article.eval(return_soup=True, data=data)
+            articles.append(dict(
+                IndexPage.checkpoint_entry(article, soup),
+                last_count=(
+                    None if Page.last_counts is None
+                    else Page.last_counts.get(article.rel_path)
+                ),
+            ))
+    Path(manifest_path).write_text(
+        json.dumps(
+            {'articles': articles, 'errors': Page.errors or []}, ensure_ascii=False,
+        ) + '\n',
+        encoding='utf8', newline='\n',
+    )
+    return manifest_path
+
+
+def merge_shards(
+    manifest_paths, subsite_root, subsite_template_root, subsite_name, restored=(),
+):
+    """
+    部分マニフェストを結合してカテゴリのゆれを確認し、目次・カテゴリページを生成します
+    (build_index のコンテクスト内で呼んでください、ページ更新日・シグネチャ・エラー・
+    チェックポイントも結合します)
+    restored はチェックポイントから復元した (評価しなかった) 記事の記録です
+    """
+    logger.info('部分マニフェスト結合')
+    site_root = Path(File.site_root).resolve()
+    entries = list(restored)
+    for manifest_path in manifest_paths:
+        manifest = json.loads(Path(manifest_path).read_text(encoding='utf8'))
+        if Page.errors is not None:
+            Page.errors += manifest['errors']
+        for a in manifest['articles']:
+            last_count = a.pop('last_count')
+            if Page.last_counts is not None and last_count is not None:
+                Page.last_counts[a['rel_path']] = last_count
+            if 'signature' in a:
+                restore_signature(a)
+            entries.append(a)
+
+    entries.sort(key=lambda a: a['rel_path'])  # シャード数によらない順に登録する
+    articles = []
+    all_cats = {}
+    all_cat_paths = set()
+    for a in entries:
+
+        def make_record(cat_ids, a=a):
+            return PageRecord(
+                a['rel_path'], a['title'], a['timestamp'], a['count'], cat_ids,
+            )
+
+        def raise_error(msg, a=a):
+            raise ValueError(f'{msg} {site_root / a["rel_path"]}')
+
+        with collecting_errors():
+            articles.append(register_categories(
+                entry_memberships(a), all_cats, all_cat_paths, subsite_name,
+                make_record, raise_error,
+            ))
+            IndexPage.record_checkpoint(a, subsite_name)
+    return IndexPage(
+        subsite_root, subsite_template_root, subsite_name,
+        collected=(articles, list(all_cats.values()), all_cat_paths),
+    )
+
+
+def build_sharded(
+    subsite_root, subsite_template_root, subsite_name, n_shards=None, work_dir=None,
+):
+    """
+    記事ページをパスのハッシュで n_shards 個に分け、プロセスごとに評価して結合します
+    IndexPage(subsite_root, subsite_template_root, subsite_name) の代わりに
+    build_index のコンテクスト内で呼んでください
+    """
+    n_shards = n_shards or os.cpu_count() or 1
+    shards = [
+        shard_paths(subsite_root, i, n_shards) for i in range(n_shards)
+    ]
+    # チェックポイントから変わっていない記事ページはシャードに渡さない
+    restored = []
+    seen = set()
+    for paths in shards:
+        for path in list(paths):
+            seen.add(File(path).rel_path)
+            entry = IndexPage.checkpointed(path, subsite_name)
+            if entry is None:
+                continue
+            paths.remove(path)
+            with collecting_errors():
+                IndexPage.restore(entry, path, subsite_name)
+                restored.append(entry)
+    IndexPage.forget_missing(subsite_name, seen)
+    logger.info(f'記事ページ収集 ({n_shards} シャード)')
+    with (
+        tempfile.TemporaryDirectory() if work_dir is None else nullcontext(work_dir)
+    ) as work_dir:
+        work_dir = Path(work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=n_shards) as executor:
+            futures = [
+                executor.submit(
+                    build_shard, paths, work_dir / f'shard-{i}.json',
+                    build_state(subsite_name, [File(p).rel_path for p in paths]),
+                )
+                for i, paths in enumerate(shards)
+            ]
+            manifest_paths = [future.result() for future in futures]
+        return merge_shards(
+            manifest_paths, subsite_root, subsite_template_root, subsite_name, restored,
+        )
@@ -2,12 +2,17 @@ from bs4 import BeautifulSoup, Doctype, Tag, Comment, NavigableString
 from pathlib import Path
 import os
 import datetime
+import html
 import logging
 logger = logging.getLogger(__name__)
 
 
+# 確認の入力を得る関数 (None なら input、ワーカーではクライアントに問い合わせる関数)
+ask = None
+
+
 def _confirm(prompt):
-    return input(prompt + ' [y/N]: ').strip().lower() == 'y'
+    return (ask or input)(prompt + ' [y/N]: ').strip().lower() == 'y'
 
 
 def _fmt(s):
@@ -120,6 +125,29 @@ def set_title(soup, title, subsite_name):
     soup.find('h1').string = title
 
 
+class RefIndex:
+    """
+    dl.ref / ol.ref の参考文献をキーと URL で引くための索引です
+    参考文献を追加するたびに木を走査しないよう、追加する側が索引も更新します
+    """
+    def __init__(self, ref_tag):
+        self.dts = {}  # キー -> 最初の dt
+        self.urls = set()
+        for dt in ref_tag.find_all('dt'):
+            self.dts.setdefault(dt.get_text(), dt)
+        for a in ref_tag.find_all('a'):
+            self.urls.add(a.get('href'))
+
+
+def _is_ref_heading(tag):
+    # 描画済みのアンカーなどの子があってもテキストで判定する
+    return tag.name == 'h2' and tag.get_text().strip() == '参考文献'
+
+
+def _find_ref_heading(item):
+    return item.find(_is_ref_heading)
+
+
 def add_references(soup, references):
     item = soup.find('div', class_='item')
     dl_tag = item.find('dl', class_='ref')
@@ -127,7 +155,7 @@ def add_references(soup, references):
         raise ValueError('There is a dl.ref')
     ol_tag = item.find('ol', class_='ref')
     if ol_tag is None:
-        h2_tag = item.find('h2', string='参考文献')
+        h2_tag = _find_ref_heading(item)
         if h2_tag is None:
             h2_tag = soup.new_tag('h2', string='参考文献')
             item.append(h2_tag)
@@ -136,9 +164,9 @@ def add_references(soup, references):
         item.append(ol_tag)
 
     today = datetime.datetime.now().strftime('%Y年%#m月%#d日')
-    urls_existing = {a.get('href') for a in ol_tag.find_all('a')}
+    index = RefIndex(ol_tag)
     for ref in references:
-        if 'url' in ref and ref['url'] in urls_existing:
+        if 'url' in ref and ref['url'] in index.urls:
             logging.info(f'Already registered: url={ref["url"]}')
             continue
         li_tag = soup.new_tag('li')
@@ -147,6 +175,7 @@ def add_references(soup, references):
             a_tag = soup.new_tag('a', href=ref['url'])
             a_tag['class'] = 'asis'
             li_tag.extend([', ', a_tag, f', {today}参照.'])
+            index.urls.add(ref['url'])
         ol_tag.append(li_tag)
         ol_tag.append('\n')
 
@@ -172,7 +201,7 @@ def add_references_with_key(soup, references):
         raise ValueError('There is a ol.ref')
     dl_tag = item.find('dl', class_='ref')
     if dl_tag is None:
-        h2_tag = item.find('h2', string='参考文献')
+        h2_tag = _find_ref_heading(item)
         if h2_tag is None:
             h2_tag = soup.new_tag('h2', string='参考文献')
             item.append(h2_tag)
@@ -180,15 +209,25 @@ def add_references_with_key(soup, references):
         dl_tag = soup.new_tag('dl', attrs={'class': 'ref small'})
         item.append(dl_tag)
 
+    index = RefIndex(dl_tag)
     for ref in references:
+        key = ref['key'].strip()
+        if not key:  # CSV の空のキー (末尾のカンマなど) は引かない
+            logging.info(f'Skipped a reference without key: {ref["title"]}')
+            continue
+        dt_tag = index.dts.get(key)
+        urls = ref.get('urls', [])
+        if dt_tag is None and any(url in index.urls for url in urls):
+            logging.info(f'Already registered: url={urls}')
+            continue
         dd_tag = soup.new_tag('dd')
         dd_tag.append(BeautifulSoup(
             '\n' + ref['title'].strip(),
             'html.parser',
         ))
-        if 'urls' in ref and len(ref['urls']) > 0:
+        if urls:
             ul_tag = soup.new_tag('ul')
-            for url in ref['urls']:
+            for url in urls:
                 a_tag = soup.new_tag('a', href=url)
                 a_tag['class'] = 'asis'
                 li_tag = soup.new_tag('li')
@@ -197,16 +236,12 @@ def add_references_with_key(soup, references):
             ul_tag.append('\n')
             dd_tag.extend(['\n', ul_tag, '\n'])
 
-        dt_tag = next(
-            (dt for dt in dl_tag.find_all('dt') if dt.get_text() == ref['key']),
-            None,
-        )
         if dt_tag is not None:
             dd_tag_existing = dt_tag.find_next_sibling('dd')
             if _dd_signature(dd_tag) == _dd_signature(dd_tag_existing):
-                logging.info(f'No updates: key={ref["key"]}')
+                logging.info(f'No updates: key={key}')
                 continue
-            logging.info(f'Already registered: key={ref["key"]}')
+            logging.info(f'Already registered: key={key}')
             logging.info(f'\n{dd_tag_existing}')
             logging.info(f'Your input:\n{dd_tag}')
             if not _confirm('Overwrite?'):
@@ -214,8 +249,10 @@ def add_references_with_key(soup, references):
             dd_tag_existing.replace_with(dd_tag)
         else:
             dt_tag = soup.new_tag('dt')
-            dt_tag.append(ref['key'])
+            dt_tag.append(key)
             dl_tag.extend([dt_tag, '\n', dd_tag, '\n'])
+            index.dts[key] = dt_tag
+        index.urls.update(urls)
 
 
 def add_categories(soup, cats):
@@ -266,6 +303,70 @@ def add_categories(soup, cats):
         n += 1
 
 
+def rename_categories(soup, old_paths, new_path, new_name):
+    """
+    div.categories のうち old_paths (カテゴリページのファイル名、拡張子なし) への
+    リンクを new_path, new_name に付け替えます (重複したリンクは 1 つにします)
+    付け替えたら True を返します
+    """
+    div_tag = soup.find('div', class_='categories')
+    if div_tag is None:
+        return False
+    a_tags = div_tag.find_all('a')
+    kept = [a for a in a_tags if Path(a.get('href')).stem == new_path]
+    changed = removed = False
+    for a in a_tags:
+        stem = Path(a.get('href')).stem
+        if stem not in old_paths or stem == new_path:
+            continue
+        changed = True
+        if kept:  # 付け替え先のリンクが既にあれば消す
+            a.extract()
+            removed = True
+            continue
+        a['href'] = a['href'].rsplit('/', 1)[0] + f'/{new_path}.html'
+        kept.append(a)
+    for a in kept:
+        if a.get_text() != new_name:
+            a.string = new_name
+            changed = True
+    if not removed:
+        return changed
+    # 区切りを付け直す
+    a_tags = div_tag.find_all('a')
+    div_tag.clear()
+    div_tag.append('\n')
+    for i, a in enumerate(a_tags):
+        if i != 0:
+            div_tag.append(' |\n')
+        div_tag.append(a)
+    div_tag.append('\n')
+    return changed
+
+
+REDIRECT_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta http-equiv="refresh" content="0; url={url}">
+<link rel="canonical" href="{url}">
+</head>
+<body><a href="{url}">{url}</a></body>
+</html>
+'''
+
+
+def redirect_html(url):
+    """
+    url に転送するだけのページです (目次ビルドと lint の対象外になります)
+    """
+    return REDIRECT_HTML.format(url=html.escape(url))
+
+
+def is_redirect(text):
+    return '<meta http-equiv="refresh"' in text
+
+
 def _clear_children(element, replace_to=''):
     for child in element.children:
         child.replace_with(replace_to)
@@ -284,7 +385,7 @@ def clear_item(soup):
              ul_tag = child.select_one('ul')
              _clear_children(ul_tag)
              ul_tag.extend(['\n', soup.new_tag('li'), '\n'])
-         elif child.name == 'h2' and child.string == '参考文献':
+         elif _is_ref_heading(child):
              pass
          elif _eq(child, 'ol.ref'):
              _clear_children(child)
@@ -297,3 +398,93 @@ def clear_item(soup):
              cleared_last = True
          else:
              cleared_last = False
+
+
+def _mode_buttons(i, lang):
+    label = '配色切替' if lang == 'ja' else 'Light/Dark'
+    return (
+        f'<div class="mode-container">{label}'
+        f'<div id="mode-light-{i}" class="mode-btn"></div>'
+        f'<div id="mode-dark-{i}" class="mode-btn"></div>'
+        '</div>'
+    )
+
+
+def _prerendered(html):
+    """
+    HTML 断片のトップレベルの要素に data-prerender を付けて返します
+    """
+    nodes = list(BeautifulSoup(html, 'html.parser').contents)
+    for node in nodes:
+        if isinstance(node, Tag):
+            node['data-prerender'] = ''
+    return nodes
+
+
+def clear_prerendered(soup):
+    for tag in soup.find_all(attrs={'data-prerender': True}):
+        tag.decompose()
+    sidebar = soup.find(id='sidebar')
+    if sidebar is not None and sidebar.has_attr('data-prerendered'):
+        del sidebar['data-prerendered']
+
+
+def prerender_sidebar(soup):
+    """
+    funcs.js の createSidebar が描画するサイドバー・小見出し一覧・配色切替ボタンを
+    あらかじめ描画します (描画した要素には data-prerender を付けます)
+    div#sidebar がなければ何もせず False を返します
+    """
+    sidebar = soup.find(id='sidebar')
+    if sidebar is None:
+        return False
+    clear_prerendered(soup)
+    app = soup.find(id='app')
+    data = app.attrs if app is not None else {}
+    repo = data.get('data-repo') or 'cookie-box'
+    is_index = data.get('data-is-index') == 'true'
+    link_top = data.get('data-link-top') == 'true'
+    lang = data.get('data-lang') or 'ja'
+
+    index_url = 'index.html' if is_index else '../index.html'
+    to_index = f'<a class="index-link" href="{index_url}"></a>'
+    git_hub = f'<a href="https://github.com/CookieBox26/{repo}/issues">Issues</a>'
+
+    content = f'<h2 class="logo">{to_index}</h2>'
+    content += f'<p>{_mode_buttons(1, lang)}</p>'
+    if not is_index:
+        content += f'<p>ご指摘等は {git_hub} までご連絡ください</p>'
+        content += '<p><a href="#">ページの一番上に戻る</a></p>'
+    headers = soup.find_all(['h2', 'h3'])
+    if headers:
+        index = '<h5>ページ内の小見出し一覧</h5>'
+        for i, header in enumerate(headers):
+            indent = 'indent' if header.name == 'h3' else ''
+            text = html.escape(header.get_text(), quote=False)
+            index += f'<p class="{indent}"><a href="#head{i}">{text}</a></p>'
+            header.extend(_prerendered(f'<a id="head{i}"></a>'))
+        content += f'<div id="headers">{index}</div>'
+
+    sp_header = soup.find(id='smartphone-header')
+    if sp_header is not None:
+        sp_header_left = '<span></span>' if is_index else to_index
+        sp_header.extend(_prerendered(sp_header_left + _mode_buttons(0, lang)))
+
+    if is_index:
+        div = _prerendered(f'<div>{content}</div>')[0]
+        bookmark = sidebar.find(id='bookmark')
+        if bookmark is not None:
+            bookmark.insert_before(div)
+        else:
+            sidebar.append(div)
+    else:
+        sidebar.extend(_prerendered(content))
+    if link_top:
+        top_url = '../index.html' if is_index else '../../index.html'
+        to_top = f'From&nbsp;<a class="top-link" href="{top_url}"></a>'
+        sidebar.extend(_prerendered(f'<div class="top-link">{to_top}</div>'))
+        footer = soup.find(id='smartphone-footer')
+        if footer is not None:
+            footer.extend(_prerendered(f'<span>{to_top}</span>'))
+    sidebar['data-prerendered'] = 'true'
+    return True
@@ -0,0 +1,229 @@
+"""
+記事編集補助機能を常駐させるワーカーとそのクライアントです
+クライアント側では重い依存 (bs4, jinja2, toml 等) をインポートしません
+"""
+from pathlib import Path
+import subprocess
+import tempfile
+import tomllib
+import socket
+import stat
+import json
+import os
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _runtime_dir():
+    """
+    ソケットを置く自分専用のディレクトリです
+    ($XDG_RUNTIME_DIR、なければ一時ディレクトリの下に 0700 で作ります)
+    """
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return Path(os.environ['XDG_RUNTIME_DIR'])
+    if not hasattr(os, 'getuid'):
+        return Path(tempfile.gettempdir())
+    runtime_dir = Path(tempfile.gettempdir()) / f'csu-worker-{os.getuid()}'
+    try:
+        runtime_dir.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    st = runtime_dir.lstat()
+    if (
+        not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid()
+        or st.st_mode & 0o077
+    ):
+        raise SystemExit(f'ワーカー用のディレクトリが自分専用ではありません {runtime_dir}')
+    return runtime_dir
+
+
+def default_socket_path():
+    if 'CSU_WORKER_SOCKET' in os.environ:
+        return Path(os.environ['CSU_WORKER_SOCKET'])
+    return _runtime_dir() / 'csu-worker.sock'
+
+
+def job_commands(conf, edited):
+    """
+    最後に編集した記事 edited のためにジョブの後に実行するコマンドを設定から作ります
+    """
+    commands = []
+    if edited is not None:
+        commands.append((True, ['git', 'status']))
+        for key in ['text_editor', 'web_browser']:
+            if key in conf:
+                commands.append((False, [conf[key], str(edited)]))
+    return commands
+
+
+def run_commands(commands):
+    """
+    ジョブの後に実行するコマンド [(終了を待つか, コマンド), ...] を実行します
+    """
+    for wait, command in commands:
+        if wait:
+            subprocess.run(command)
+        else:
+            subprocess.Popen(command)
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message, ensure_ascii=False).encode('utf8') + b'\n')
+
+
+def _recv(conn):
+    with conn.makefile('rb') as f:
+        line = f.readline()
+    return json.loads(line) if line else None
+
+
+def _connect(path):
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if (
+        not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid()
+        or st.st_mode & 0o077
+    ):  # 他のユーザが作ったソケットには接続しない
+        logger.warning(f'自分専用でないソケットには接続しません {path}')
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(str(path))
+    except (ConnectionRefusedError, FileNotFoundError):
+        conn.close()
+        return None
+    return conn
+
+
+class _LogCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.name, record.levelno, record.getMessage()))
+
+
+def _handle(helper, request, conn):
+    import cookies_site_utils.soup_util as su
+    collector = _LogCollector()
+
+    def ask(prompt):
+        # 確認はクライアントの端末で入力してもらう (それまでのログも先に送る)
+        _send(conn, {'prompt': prompt, 'logs': collector.records})
+        collector.records = []
+        reply = _recv(conn)
+        if reply is None:
+            raise EOFError('クライアントが応答しませんでした')
+        return reply['answer']
+
+    root = logging.getLogger()
+    root.addHandler(collector)
+    level = root.level
+    root.setLevel(min(level, request.get('log_level', logging.INFO)))
+    cwd = os.getcwd()
+    su.ask = ask
+    try:
+        os.chdir(request['cwd'])
+        # 実行するコマンドはクライアントが自分の設定から作る (ここではデータのみ返す)
+        edited = helper.edit_articles(request['conf_path'])
+        response = {'ok': True, 'edited': None if edited is None else str(edited)}
+    except Exception as e:
+        logger.exception('ジョブでエラーが発生しました')
+        response = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+    finally:
+        su.ask = None
+        os.chdir(cwd)
+        root.removeHandler(collector)
+        root.setLevel(level)
+    response['logs'] = collector.records
+    return response
+
+
+def serve_worker(path=None):
+    """
+    Unix ソケットでジョブを受け付けるワーカーを起動します (stop_worker で止まります)
+    インポート・パース済みの設定・記事のキャッシュはリクエストをまたいで保持します
+    """
+    from cookies_site_utils.article_helper import ArticleHelper
+    path = Path(path or default_socket_path())
+    conn = _connect(path)
+    if conn is not None:
+        conn.close()
+        raise SystemExit(f'既にワーカーが起動しています {path}')
+    path.unlink(missing_ok=True)  # 前回のワーカーが残したソケット
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)  # 自分以外は接続できないようにする
+    try:
+        server.bind(str(path))
+    finally:
+        os.umask(umask)
+    server.listen()
+    logger.info(f'ワーカー起動 {path}')
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    request = _recv(conn)
+                    if request is None:
+                        continue
+                    if request.get('command') == 'stop':
+                        _send(conn, {'ok': True})
+                        break
+                    _send(conn, _handle(ArticleHelper, request, conn))
+                except (BrokenPipeError, ConnectionResetError):
+                    logger.warning('クライアントが切断しました')
+    finally:
+        server.close()
+        path.unlink(missing_ok=True)
+        logger.info('ワーカー終了')
+
+
+def stop_worker(path=None):
+    conn = _connect(path or default_socket_path())
+    if conn is None:
+        return False
+    with conn:
+        _send(conn, {'command': 'stop'})
+        _recv(conn)
+    return True
+
+
+def _replay_logs(records):
+    for name, level, msg in records:
+        logging.getLogger(name).log(level, msg)
+
+
+def run_in_worker(conf_path, path=None):
+    """
+    ワーカーが起動していればジョブを依頼して True を返します (起動していなければ False)
+    """
+    conn = _connect(path or default_socket_path())
+    if conn is None:
+        return False
+    conf_path = os.path.abspath(conf_path)
+    with conn:
+        _send(conn, {
+            'conf_path': conf_path,
+            'cwd': os.getcwd(),
+            'log_level': logging.getLogger().getEffectiveLevel(),
+        })
+        while True:
+            response = _recv(conn)
+            if response is None:
+                raise SystemExit('ワーカーが応答しませんでした')
+            _replay_logs(response['logs'])
+            if 'prompt' not in response:
+                break
+            _send(conn, {'answer': input(response['prompt'])})  # ジョブの確認
+    if not response['ok']:
+        raise SystemExit(f'ワーカーでエラーが発生しました {response["error"]}')
+    conf = tomllib.loads(Path(conf_path).read_text(encoding='utf8'))
+    edited = response['edited']
+    run_commands(job_commands(conf, None if edited is None else Path(edited)))
+    return True
@@ -1,5 +1,10 @@
-from cookies_site_utils.article_helper import ArticleHelper
+from cookies_site_utils.article_helper import (
+    ArticleHelper, ArticlePageEx, DocumentCache,
+)
+import cookies_site_utils.soup_util as su
+from bs4 import BeautifulSoup
 from pathlib import Path
+import copy
 
 
 def test_article_helper(tmp_path):
@@ -25,3 +30,177 @@ def test_article_helper(tmp_path):
 
     Path('tests/docs/articles/fugaga.html').unlink()
     conf_path.unlink()
+    Path('.soupify_manifest.json').unlink()
+
+
+def test_document_cache(tmp_path):
+    path = tmp_path / 'a.html'
+    path.write_text('<p>あ</p>', encoding='utf8')
+    calls = []
+
+    def parse():
+        calls.append(path)
+        return BeautifulSoup(path.read_text(encoding='utf8'), 'html.parser'), ''
+
+    cache = DocumentCache()
+    soup_1, _ = cache.get(path, parse)
+    soup_1.p.string = 'い'  # コピーの編集はキャッシュに影響しない
+    soup_2, _ = cache.get(path, parse)
+    assert len(calls) == 1
+    assert soup_2.p.string == 'あ'
+
+    # ファイルが変わったらパースし直す
+    path.write_text('<p>うう</p>', encoding='utf8')
+    soup_3, _ = cache.get(path, parse)
+    assert len(calls) == 2
+    assert soup_3.p.string == 'うう'
+
+
+def test_eval_uses_cache_without_copy(tmp_path, monkeypatch):
+    path = tmp_path / 'a.html'
+    _write_article(path, [('c', 'C')])
+    monkeypatch.setattr(ArticleHelper, 'doc_cache', DocumentCache())
+    copies = []
+    copy_ = copy.copy
+    monkeypatch.setattr(
+        'cookies_site_utils.article_helper.copy.copy',
+        lambda x: copies.append(x) or copy_(x),
+    )
+    ape = ArticlePageEx(path, 'hoge')
+    ape.eval()
+    assert copies == [] and ape.title == 'a'
+    soup = ape.eval(return_soup=True)  # 編集するかもしれないのでコピーを返す
+    assert copies and soup is not copies[0]
+    ape.eval()
+    soup, _ = ape.parse()  # 評価の後も parse はコピーを返す
+    assert len(copies) == 2 and soup is not copies[1]
+
+
+def _write_article(path, cats):
+    links = ' |\n'.join(
+        f'<a href="../categories/{stem}.html">{name}</a>' for stem, name in cats
+    )
+    path.write_text(
+        f'<html><head><title>{path.stem} - hoge</title></head><body>'
+        f'<div class="item"><h1>{path.stem}</h1>\n'
+        f'<div class="categories">\n{links}\n</div></div></body></html>\n',
+        encoding='utf8',
+    )
+
+
+def test_copy_from_prerendered(tmp_path):
+    path = tmp_path / 'a.html'
+    html = (
+        '<html><head><title>a - hoge</title>'
+        '<script data-repo="a" id="app" src="../funcs.js"></script></head><body>'
+        '<div class="container"><div id="sidebar"></div><main class="main">'
+        '<div class="item"><h1>a</h1>\n<h2>あああ</h2>\n<p>いいい</p>\n'
+        '<h2>参考文献</h2>\n<ol class="ref small">\n<li>ううう</li>\n</ol>\n'
+        '</div></main></div></body></html>\n'
+    )
+    soup = BeautifulSoup(html, 'html.parser')
+    assert su.prerender_sidebar(soup)
+    path.write_text(su.decode_soup(soup), encoding='utf8')
+
+    soup = ArticlePageEx(path, 'hoge').copy_soup('b')
+    assert soup.find(attrs={'data-prerender': True}) is None
+    assert not soup.find(id='sidebar').has_attr('data-prerendered')
+    item = soup.find('div', class_='item')
+    assert [h2.get_text() for h2 in item.find_all('h2')] == ['参考文献']
+    assert item.find('ol', class_='ref').find('li') is None
+
+
+def test_rename_category(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'docs' / 'articles').mkdir(parents=True)
+    (tmp_path / 'docs' / 'categories').mkdir()
+    articles = tmp_path / 'docs' / 'articles'
+    _write_article(articles / 'a0.html', [('c', 'C')])
+    _write_article(articles / 'a1.html', [('d', 'D'), ('e', 'E')])
+    _write_article(articles / 'a2.html', [('f', 'F')])
+    for stem in 'cdef':
+        (tmp_path / 'docs' / 'categories' / f'{stem}.html').write_text('', encoding='utf8')
+    conf_path = tmp_path / '.helper.toml'
+
+    def run(job):
+        conf_path.write_text(
+            'subsite_name = "hoge"\n[[job_groups]]\npaths = ["docs/articles/*.html"]\n'
+            f'[[job_groups.jobs]]\n{job}', encoding='utf8',
+        )
+        parsed = []
+        parse = ArticlePageEx.parse
+        monkeypatch.setattr(
+            ArticlePageEx, 'parse',
+            lambda self, *args, **kwargs: (
+                parsed.append(self.path.name) or parse(self, *args, **kwargs)
+            ),
+        )
+        ArticleHelper.run_jobs(conf_path)
+        return sorted(set(parsed))
+
+    assert run(
+        'job_type = "RENAME_CATEGORY"\npath = "c"\nnew_path = "cc"\nnew_name = "CC"\n'
+    ) == ['a0.html']
+    assert '<a href="../categories/cc.html">CC</a>' in (articles / 'a0.html').read_text(encoding='utf8')
+    assert not (tmp_path / 'docs' / 'categories' / 'c.html').exists()
+
+    # 統合先のリンクが既にある記事はリンクが 1 つになる
+    assert run(
+        'job_type = "MERGE_CATEGORIES"\npaths = ["d", "cc"]\nnew_path = "e"\n'
+        'new_name = "EE"\nredirect = true\n'
+    ) == ['a0.html', 'a1.html']
+    text = (articles / 'a1.html').read_text(encoding='utf8')
+    assert text.count('categories/') == 1 and '>EE</a>' in text
+    assert '<a href="../categories/e.html">EE</a>' in (articles / 'a0.html').read_text(encoding='utf8')
+    assert su.is_redirect(
+        (tmp_path / 'docs' / 'categories' / 'd.html').read_text(encoding='utf8')
+    )
+    assert (articles / 'a2.html').read_text(encoding='utf8').count('>F</a>') == 1
+
+    # 既存のカテゴリに別の名前で統合すると、統合先のみにリンクしている記事も名前を揃える
+    assert run(
+        'job_type = "MERGE_CATEGORIES"\npaths = ["e"]\nnew_path = "f"\nnew_name = "FF"\n'
+    ) == ['a0.html', 'a1.html', 'a2.html']
+    for name in ['a0.html', 'a1.html', 'a2.html']:
+        text = (articles / name).read_text(encoding='utf8')
+        assert '<a href="../categories/f.html">FF</a>' in text and '>F</a>' not in text
+
+
+def test_soupify_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    articles = tmp_path / 'docs' / 'articles'
+    articles.mkdir(parents=True)
+    for i in range(3):
+        _write_article(articles / f'a{i}.html', [('c', 'C')])
+    conf_path = tmp_path / '.helper.toml'
+    conf_path.write_text(
+        'subsite_name = "hoge"\nsoupify_jobs = 2\n[[job_groups]]\n'
+        'paths = ["docs/articles/*.html"]\n'
+        '[[job_groups.jobs]]\njob_type = "SOUPIFY"\n', encoding='utf8',
+    )
+    assert ArticleHelper.run_jobs(conf_path)  # 整形したので git status する
+    assert ArticleHelper.run_jobs(conf_path) == []  # すべて整形済み
+
+    # 手で編集した記事のみ整形し直す
+    _write_article(articles / 'a1.html', [('d', 'D')])
+    paths = sorted(articles.glob('*.html'))
+    manifest_path = tmp_path / '.soupify_manifest.json'
+    assert ArticleHelper.soupify_all(paths, manifest_path) == [articles / 'a1.html']
+    assert ArticleHelper.soupify_all(paths, manifest_path) == []
+
+
+def test_soupify_manifest_working_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    articles = tmp_path / 'site' / 'docs' / 'articles'
+    articles.mkdir(parents=True)
+    _write_article(articles / 'a0.html', [('c', 'C')])
+    (tmp_path / 'conf').mkdir()
+    conf_path = Path('conf/.helper.toml')  # working_dir からではなく今の場所からの相対パス
+    conf_path.write_text(
+        f'subsite_name = "hoge"\nworking_dir = "{(tmp_path / "site").as_posix()}"\n'
+        '[[job_groups]]\npaths = ["docs/articles/*.html"]\n'
+        '[[job_groups.jobs]]\njob_type = "SOUPIFY"\n', encoding='utf8',
+    )
+    assert ArticleHelper.run_jobs(conf_path)
+    assert (tmp_path / 'conf' / '.soupify_manifest.json').is_file()
+    assert not (tmp_path / 'site' / 'conf').exists()
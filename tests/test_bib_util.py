@@ -0,0 +1,55 @@
+from cookies_site_utils.bib_util import iter_bibtex, iter_references
+import io
+
+
+def test_iter_bibtex():
+    bib = '''
+    @comment{ignored}
+    @article{vaswani2017,
+      author = {Vaswani, Ashish and {Others}},
+      title = "Attention Is All You Need",
+      journal = {NeurIPS},
+      year = 2017,
+      url = {https://example.com/a}
+    }
+    @book{knuth, title={The {\\TeX}book}}
+    '''
+    entries = list(iter_bibtex(io.StringIO(bib)))
+    assert [(t, k) for t, k, _ in entries] == [
+        ('article', 'vaswani2017'), ('book', 'knuth'),
+    ]
+    fields = entries[0][2]
+    assert fields['author'] == 'Vaswani, Ashish and {Others}'
+    assert fields['title'] == 'Attention Is All You Need'
+    assert fields['year'] == '2017'
+    assert entries[1][2]['title'] == 'The {\\TeX}book'
+
+
+def test_iter_bibtex_parens():
+    bib = '@article(a, title={A (1)})\n@string(x = "y")\n@misc{b, title={B}}\n'
+    entries = list(iter_bibtex(io.StringIO(bib)))
+    assert entries == [('article', 'a', {'title': 'A (1)'}), ('misc', 'b', {'title': 'B'})]
+
+
+def test_iter_references(tmp_path):
+    path = tmp_path / 'refs.bib'
+    path.write_text('''
+    @misc{a, title={A & B}, url={https://a}}
+    @misc{a, title={dup key}}
+    @misc{b, title={dup url}, url={https://a}}
+    @misc{c, title={C}, doi={10.1/c}, year={2020}}
+    ''', encoding='utf8')
+    refs = list(iter_references(path))
+    assert [ref['key'] for ref in refs] == ['a', 'c']
+    assert refs[0]['title'] == 'A &amp; B.'
+    assert refs[1]['urls'] == ['https://doi.org/10.1/c']
+    assert refs[1]['title'] == 'C. 2020.'
+
+    path = tmp_path / 'refs.csv'
+    path.write_text(
+        'key,title,urls\nx,X,https://x https://xx\ny,Y,https://xx\n',
+        encoding='utf8',
+    )
+    refs = list(iter_references(path))
+    assert [ref['key'] for ref in refs] == ['x']
+    assert refs[0]['urls'] == ['https://x', 'https://xx']
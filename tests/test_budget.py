@@ -0,0 +1,48 @@
+from cookies_site_utils.budget import PageBudget, local_refs
+from cookies_site_utils.builder import find_disallowed
+import pytest
+
+
+def _make_site(root):
+    (root / 'css').mkdir(parents=True)
+    (root / 'articles').mkdir()
+    (root / 'css' / 'style.css').write_text('a' * 1000, encoding='utf8')
+    (root / 'funcs.js').write_text('b' * 500, encoding='utf8')
+    for name, body in [('small', 'x'), ('large', 'x' * 3000), ('medium', 'x' * 1500)]:
+        (root / 'articles' / f'{name}.html').write_text(
+            '<html><head><link rel="stylesheet" href="../css/style.css?v=1">'
+            '<script src="../funcs.js"></script>'
+            '<script src="https://example.com/a.js"></script></head>'
+            f'<body>{body}</body></html>\n',
+            encoding='utf8',
+        )
+    return root
+
+
+def test_local_refs():
+    data = (
+        b'<link rel="canonical" href="a.html"><link rel="stylesheet" href="s.css">'
+        b'<img src="i.png"><img src="i.png"><img src="data:image/png;base64,xx">'
+        b'<script src="//cdn.example.com/a.js"></script>'
+    )
+    assert local_refs(data) == ['s.css', 'i.png']
+
+
+def test_budget(tmp_path):
+    site_root = _make_site(tmp_path / 'docs')
+    cache_path = tmp_path / '.budget_cache.json'
+    budgets = {'articles/*.html': {'bytes': 1000, 'asset_bytes': 2000}}
+    budget = PageBudget(budgets, cache_path)
+    with pytest.raises(ValueError):
+        find_disallowed(site_root, ['**'], budget=budget)
+    assert [o[0] for o in budget.offenders] == [
+        'articles/large.html', 'articles/medium.html',
+    ]
+    assert set(budget.offenders[0][2]) == {'bytes'}
+    assert budget.measure('articles/small.html')['asset_bytes'] == 1500
+
+    # 2 回目はキャッシュから測る
+    budget = PageBudget({'articles/*.html': {'asset_bytes': 1000}}, cache_path)
+    assert len(budget.cache) == 3
+    find_disallowed(site_root, ['**'], raise_error=False, budget=budget)
+    assert len(budget.offenders) == 3
@@ -1,8 +1,13 @@
 from cookies_site_utils.builder import (
     build_index, IndexPage, find_disallowed,
-    ArticlePage,
+    ArticlePage, Page,
 )
+from cookies_site_utils.core import MemoryStorage, ArchiveStorage
+import cookies_site_utils.soup_util as su
 from pathlib import Path
+import tarfile
+import json
+import pytest
 
 
 def test_build_index():
@@ -35,3 +40,223 @@ def test_article_page():
     article.collect_categories(soup, all_cats, all_cat_paths)
     assert 'ふがふが' in all_cats
     assert all_cats['ふがふが'].cat_name == 'ふがふが'
+
+
+def test_page_record():
+    article = ArticlePage('tests/docs/articles/fuga.html', 'hoge')
+    soup = article.eval(return_soup=True)
+    all_cats = {}
+    record = article.collect_categories(soup, all_cats, set())
+    assert not hasattr(record, '__dict__')
+    assert record.title == 'ふが'
+    assert record.cat_ids == (all_cats['ふがふが'].cat_id,)
+    assert all_cats['ふがふが'].articles == [record]
+    assert record.as_anchor(article.path) == article.as_anchor(article.path)
+
+
+def _make_site(root, n_articles):
+    (root / 'docs' / 'articles').mkdir(parents=True)
+    (root / 'templates').mkdir()
+    for i in range(n_articles):
+        (root / 'docs' / 'articles' / f'a{i}.html').write_text(
+            f'<html><head><title>a{i} - hoge</title></head><body>'
+            f'<div class="item"><h1>a{i}</h1>\n<div class="categories">'
+            '<a href="../categories/c.html">c</a></div></div></body></html>\n',
+            encoding='utf8',
+        )
+    (root / 'templates' / 'index_template.html').write_text(
+        '<html><head><title>hoge</title></head><body><h1>hoge</h1>\n'
+        '{{ list_article }}\n{{ pagination }}\n</body></html>',
+        encoding='utf8',
+    )
+    (root / 'templates' / 'category_template.html').write_text(
+        '<html><head><title>{{ category_name }} - hoge</title></head><body>'
+        '<h1>{{ category_name }}</h1>\n{{ list_article }}\n{{ pagination }}\n'
+        '</body></html>',
+        encoding='utf8',
+    )
+    return root / 'docs', root / 'templates'
+
+
+def test_pagination(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 5)
+    with build_index(site_root, page_size=2):
+        index_ = IndexPage(site_root, template_root, 'hoge')
+    names = sorted(p.name for p in site_root.glob('index*.html'))
+    assert names == ['index-2.html', 'index-3.html', 'index.html']
+    assert (site_root / 'categories' / 'c-3.html').is_file()
+    assert 'index-2.html' in (site_root / 'index.html').read_text(encoding='utf8')
+    rel_paths = {page.rel_path for page in index_.get_pages()}
+    assert {'index-3.html', 'categories/c-2.html'} <= rel_paths
+
+    # 分割数が減ったら不要なページは削除される
+    with build_index(site_root, page_size=3):
+        IndexPage(site_root, template_root, 'hoge')
+    assert not (site_root / 'index-3.html').exists()
+    assert not (site_root / 'categories' / 'c-3.html').exists()
+    assert (site_root / 'categories' / 'c-2.html').is_file()
+
+    # 分割して生成した印のないページ・リダイレクトは削除しない
+    c_3 = site_root / 'categories' / 'c-3.html'
+    c_3.write_text(su.redirect_html('d.html'), encoding='utf8')
+    with build_index(site_root, page_size=3):
+        IndexPage(site_root, template_root, 'hoge')
+    assert su.is_redirect(c_3.read_text(encoding='utf8'))
+    c_3.write_text('<html><body>c-3</body></html>', encoding='utf8')
+    with pytest.raises(ValueError, match='廃れたカテゴリページ'):
+        with build_index(site_root, page_size=3):
+            IndexPage(site_root, template_root, 'hoge')
+    c_3.unlink()
+
+    # 分割しないときは削除しない (廃れたページはエラー)
+    with pytest.raises(ValueError, match='廃れたカテゴリページ'):
+        with build_index(site_root):
+            IndexPage(site_root, template_root, 'hoge')
+    assert (site_root / 'categories' / 'c-2.html').is_file()
+
+
+def test_check(tmp_path, capsys):
+    site_root, template_root = _make_site(tmp_path, 3)
+    last_counts_path = tmp_path / '.last_counts.toml'
+    with build_index(site_root, last_counts_path=last_counts_path):
+        IndexPage(site_root, template_root, 'hoge')
+    with build_index(site_root, last_counts_path=last_counts_path, check=True):
+        IndexPage(site_root, template_root, 'hoge')
+
+    # 記事を追加するとチェックモードは書き込まずに終了コード 1 で終わる
+    (site_root / 'articles' / 'a0.html').rename(site_root / 'articles' / 'b.html')
+    index_text = (site_root / 'index.html').read_text(encoding='utf8')
+    capsys.readouterr()
+    with pytest.raises(SystemExit) as e:
+        with build_index(site_root, last_counts_path=last_counts_path, check=True):
+            IndexPage(site_root, template_root, 'hoge')
+    assert e.value.code == 1
+    assert 'M index.html' in capsys.readouterr().out
+    assert (site_root / 'index.html').read_text(encoding='utf8') == index_text
+
+
+def test_collect_signatures(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 2)
+    with build_index(site_root, collect_signatures=True):
+        IndexPage(site_root, template_root, 'hoge')
+    signatures = Page.signatures
+    assert {'article', 'category', 'index'} == set(signatures)
+    assert {'div', '.item', '.categories', 'h1'} <= signatures['article']
+    assert '.item' not in signatures['index']
+
+
+def test_keep_going_and_checkpoint(tmp_path, monkeypatch):
+    site_root, template_root = _make_site(tmp_path, 3)
+    # a1 はカテゴリ名のゆれ (同じパスに別の名前) がある
+    a1 = site_root / 'articles' / 'a1.html'
+    a1.write_text(
+        a1.read_text(encoding='utf8').replace('>c</a>', '>d</a>'), encoding='utf8',
+    )
+    checkpoint_path = tmp_path / '.checkpoint.json'
+    with pytest.raises(SystemExit) as e:
+        with build_index(site_root, keep_going=True, checkpoint_path=checkpoint_path):
+            index_ = IndexPage(site_root, template_root, 'hoge')
+    assert e.value.code == 1
+    assert len(Page.errors) == 1 and 'a1.html' in Page.errors[0]
+    assert len(index_.articles) == 2
+    assert sorted(json.loads(checkpoint_path.read_text(encoding='utf8'))) == [
+        'articles/a0.html', 'articles/a2.html',
+    ]
+
+    # 直した記事ページだけ評価し直す
+    a1.write_text(
+        a1.read_text(encoding='utf8').replace('>d</a>', '>c</a>'), encoding='utf8',
+    )
+    evaluated = []
+    eval_ = ArticlePage.eval
+
+    def spy(self, *args, **kwargs):
+        evaluated.append(self.rel_path)
+        return eval_(self, *args, **kwargs)
+
+    monkeypatch.setattr(ArticlePage, 'eval', spy)
+    with build_index(site_root, keep_going=True, checkpoint_path=checkpoint_path):
+        index_ = IndexPage(site_root, template_root, 'hoge')
+    assert evaluated == ['articles/a1.html']
+    assert len(index_.articles) == 3
+    assert len(index_.all_cats) == 1
+
+
+def test_keep_going_stale_category(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 2)
+    a1 = site_root / 'articles' / 'a1.html'
+    a1.write_text(
+        a1.read_text(encoding='utf8').replace('c.html">c<', 'd.html">d<'), encoding='utf8',
+    )
+    with build_index(site_root):
+        IndexPage(site_root, template_root, 'hoge')
+    # d の唯一の記事 a1 にカテゴリ名のゆれを入れると d.html は廃れる
+    a1.write_text(
+        a1.read_text(encoding='utf8').replace('d.html">d<', 'c.html">x<'), encoding='utf8',
+    )
+    (site_root / 'index.html').unlink()
+    with pytest.raises(SystemExit) as e:
+        with build_index(site_root, keep_going=True):
+            IndexPage(site_root, template_root, 'hoge')
+    assert e.value.code == 1
+    assert len(Page.errors) == 2
+    assert 'a1.html' in Page.errors[0] and '廃れたカテゴリページ' in Page.errors[1]
+    assert (site_root / 'index.html').is_file()  # 目次ページの生成まで続ける
+
+
+def test_checkpoint_signatures(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 2)
+    checkpoint_path = tmp_path / '.checkpoint.json'
+    with build_index(site_root, checkpoint_path=checkpoint_path):
+        IndexPage(site_root, template_root, 'hoge')
+    # シグネチャのない評価結果は使わずに評価し直す
+    with build_index(site_root, checkpoint_path=checkpoint_path, collect_signatures=True):
+        IndexPage(site_root, template_root, 'hoge')
+    expected = Page.signatures['article']
+    assert {'.item', '.categories', 'h1'} <= expected
+    with build_index(site_root, checkpoint_path=checkpoint_path, collect_signatures=True):
+        IndexPage(site_root, template_root, 'hoge')
+    assert Page.signatures['article'] == expected
+
+
+def test_storage(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 3)
+    storage = MemoryStorage()
+    with build_index(site_root, storage=storage, page_size=2):
+        IndexPage(site_root, template_root, 'hoge')
+    assert not (site_root / 'index.html').exists()
+    assert b'a2' in storage.files[site_root / 'index-2.html']
+
+    with build_index(site_root, storage=ArchiveStorage(tmp_path / 'site.tar.gz', site_root)):
+        IndexPage(site_root, template_root, 'hoge')
+    with tarfile.open(tmp_path / 'site.tar.gz') as tar:
+        assert {'index.html', 'categories/c.html', 'articles/a0.html'} <= set(tar.getnames())
+
+
+def test_feed(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 3)
+    a1 = site_root / 'articles' / 'a1.html'
+    a1.write_text(a1.read_text(encoding='utf8').replace(
+        '<h1>a1</h1>', '<h1>a1</h1>\n<div class="summary"><p>要約 &amp;\n です</p></div>',
+    ), encoding='utf8')
+    # サイトルートをサブサイトの親にするとサイト全体のフィードも生成される
+    domain = 'https://example.com/'
+    with build_index(tmp_path, domain=domain, feed_size=2, feed_title='site'):
+        IndexPage(site_root, template_root, 'hoge')
+    feed = (site_root / 'feed.xml').read_text(encoding='utf8')
+    assert feed.count('<entry>') == 2
+    assert '<id>https://example.com/docs/articles/a0.html</id>' in feed
+    assert '<summary>要約 &amp; です</summary>' in feed
+    assert '<title>site</title>' in (tmp_path / 'feed.xml').read_text(encoding='utf8')
+
+    # 載せる記事と更新日が変わらなければ書き換えない
+    mtime = (site_root / 'feed.xml').stat().st_mtime_ns
+    with build_index(tmp_path, domain=domain, feed_size=2, feed_title='site'):
+        IndexPage(site_root, template_root, 'hoge')
+    assert (site_root / 'feed.xml').stat().st_mtime_ns == mtime
+
+    # ドメインがなければ生成しない
+    (site_root / 'feed.xml').unlink()
+    with build_index(tmp_path, feed_size=2):
+        IndexPage(site_root, template_root, 'hoge')
+    assert not (site_root / 'feed.xml').exists()
@@ -1,6 +1,73 @@
-from cookies_site_utils.core import File
+from cookies_site_utils.core import (
+    File, prefetch_bytes, FileSystemStorage, MemoryStorage, ArchiveStorage,
+)
+import zipfile
 
 
 class TestFile:
     def test_init(self):
         f = File('tests/docs/fuga.html')
+
+    def test_decode(self):
+        assert File.decode('あ\r\nい\rう\n'.encode('utf8')) == 'あ\nい\nう\n'
+
+
+def test_prefetch_bytes(tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f'{i}.html'
+        path.write_bytes(b'x' * (i + 1))
+        paths.append(path)
+    # 合計バイト数の上限が 1 ファイルより小さくても順に読める
+    for max_bytes in [1, 5, 1000]:
+        result = list(prefetch_bytes(paths, max_workers=2, max_bytes=max_bytes))
+        assert [p for p, _ in result] == paths
+        assert [len(d) for _, d in result] == list(range(1, 11))
+
+
+def test_write_text_crlf(tmp_path):
+    # CRLF でチェックアウトしたファイルは内容が同じなら更新なし
+    (tmp_path / 'a.html').write_bytes('あ\r\nい\r\n'.encode('utf8'))
+    File.site_root = tmp_path
+    File.start_check()
+    File(tmp_path / 'a.html').write_text('あ\nい\n')
+    assert File.finish_check() == []
+
+
+def test_memory_storage(tmp_path):
+    (tmp_path / 'a.html').write_text('a', encoding='utf8')
+    File.site_root = tmp_path
+    File.storage = MemoryStorage()
+    try:
+        File(tmp_path / 'a.html').write_text('b')
+        File(tmp_path / 'c.html').write_text('c')
+        assert File(tmp_path / 'a.html').read_text() == 'b'
+        assert File(tmp_path / 'c.html').exists()
+        assert File.storage.read_many([tmp_path / 'a.html', tmp_path / 'x.html']) == {
+            tmp_path / 'a.html': b'b',
+        }
+    finally:
+        File.storage = FileSystemStorage()
+    assert (tmp_path / 'a.html').read_text(encoding='utf8') == 'a'
+    assert not (tmp_path / 'c.html').exists()
+
+
+def test_archive_storage(tmp_path):
+    site_root = tmp_path / 'docs'
+    (site_root / 'css').mkdir(parents=True)
+    (site_root / 'css' / 'style.css').write_text('css', encoding='utf8')
+    (site_root / 'old.html').write_text('old', encoding='utf8')
+    File.site_root = site_root
+    File.storage = ArchiveStorage(tmp_path / 'site.zip', site_root)
+    try:
+        File(site_root / 'index.html').write_text('index')
+        File(site_root / 'old.html').unlink()
+        File(tmp_path / '.last_counts.toml').write_text('')  # ルートの外は直接書く
+        File.storage.close()
+    finally:
+        File.storage = FileSystemStorage()
+    with zipfile.ZipFile(tmp_path / 'site.zip') as z:
+        assert sorted(z.namelist()) == ['css/style.css', 'index.html']
+        assert z.read('index.html') == b'index'
+    assert (tmp_path / '.last_counts.toml').is_file()
+    assert not (site_root / 'index.html').exists()
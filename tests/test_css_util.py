@@ -0,0 +1,67 @@
+from cookies_site_utils.css_util import (
+    parse_css, selector_tokens, extract_critical, critical_css,
+    inline_critical, page_type,
+)
+
+CSS = '''@charset "UTF-8";
+/* コメント */
+body { margin: 0; }
+a:hover, ol.ref > li::before { color: red; }
+.token.string { color: green; }
+@media screen and (max-width: 540px) {
+  div#sidebar { display: none; }
+  table { width: 100%; }
+}
+'''
+
+
+def test_parse_css():
+    nodes = parse_css(CSS)
+    assert [n[0] for n in nodes] == ['statement', 'rule', 'rule', 'rule', 'nested']
+    assert nodes[4][2][0] == ('rule', 'div#sidebar', 'display: none;')
+
+
+def test_selector_tokens():
+    assert selector_tokens('ol.ref > li::before') == {'ol', '.ref', 'li'}
+    assert selector_tokens(':not(pre)>code[class*="language-"]') == {'code'}
+    assert selector_tokens('div#sidebar p.indent') == {'div', '#sidebar', 'p', '.indent'}
+
+
+def test_extract_critical():
+    critical, unused = extract_critical(CSS, {'article': {'body', 'div', '#sidebar'}})
+    assert critical['article'] == (
+        '@charset "UTF-8";\nbody{margin: 0;}\na:hover{color: red;}\n'
+        '@media screen and (max-width: 540px){div#sidebar{display: none;}}\n'
+    )
+    assert unused == ['ol.ref > li::before', 'table']
+
+
+def test_critical_css(tmp_path):
+    stylesheet_path = tmp_path / 'style.css'
+    stylesheet_path.write_text(CSS, encoding='utf8')
+    cache_path = tmp_path / 'cache.json'
+    signatures = {'index': {'body'}}
+    critical, _ = critical_css(stylesheet_path, signatures, cache_path)
+    mtime = cache_path.stat().st_mtime_ns
+    assert critical_css(stylesheet_path, signatures, cache_path)[0] == critical
+    assert cache_path.stat().st_mtime_ns == mtime
+
+
+def test_inline_critical():
+    html = '<head><link href="../css/style.css?v=1" rel="stylesheet"/></head>'
+    inlined = inline_critical(html, 'body{margin:0}')
+    assert inlined.startswith('<head><style>body{margin:0}</style><link ')
+    assert 'rel="preload"' in inlined
+    assert '<noscript><link href="../css/style.css?v=1" rel="stylesheet"/></noscript>' in inlined
+
+    # 他のスタイルシートが先にあっても style.css に埋め込む
+    html = '<head><link href="prism.css" rel="stylesheet"/><link href="style.css" rel="stylesheet"/></head>'
+    inlined = inline_critical(html, 'body{margin:0}')
+    assert inlined.startswith('<head><link href="prism.css" rel="stylesheet"/><style>')
+    assert inlined.count('<style>') == 1
+
+
+def test_page_type():
+    assert page_type('index-2.html') == 'index'
+    assert page_type('sub/categories/a.html') == 'category'
+    assert page_type('articles/a.html') == 'article'
@@ -0,0 +1,59 @@
+from cookies_site_utils.dupes import (
+    find_dupes, hash_params, minhash, shingles, visible_text,
+)
+import builtins
+import random
+
+
+def _article(body):
+    return (
+        '<html><head><title>t</title><style>p { color: red; }</style></head>'
+        f'<body><div class="item"><h1>t</h1>\n<p>{body}</p></div></body></html>\n'
+    )
+
+
+def test_visible_text():
+    assert visible_text(_article('あい う\nえ').encode('utf8')) == 'tあいうえ'
+
+
+def test_minhash_without_numpy(monkeypatch):
+    hashes = shingles('いろはにほへとちりぬるをわかよたれそつねならむ', 3)
+    params = hash_params(16)
+    with_numpy = minhash(hashes, params)
+    import_ = builtins.__import__
+
+    def no_numpy(name, *args, **kwargs):
+        if name == 'numpy':
+            raise ImportError(name)
+        return import_(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, '__import__', no_numpy)
+    assert minhash(hashes, params) == with_numpy
+
+
+def test_find_dupes(tmp_path):
+    rng = random.Random(0)
+    chars = 'あいうえおかきくけこさしすせそたちつてとなにぬねの'
+    base = ''.join(rng.choice(chars) for _ in range(2000))
+    other = ''.join(rng.choice(chars) for _ in range(2000))
+    texts = {
+        'a.html': base,
+        'b.html': base[:1800] + other[:200],  # コピーした記事
+        'c.html': other,
+        'd.html': '',
+    }
+    paths = []
+    for name, text in texts.items():
+        (tmp_path / name).write_text(_article(text), encoding='utf8')
+        paths.append(tmp_path / name)
+    cache_path = tmp_path / '.dupes_cache.json'
+    dupes = find_dupes(paths, threshold=0.5, cache_path=cache_path)
+    assert [(p1.name, p2.name) for _, p1, p2 in dupes] == [('a.html', 'b.html')]
+    assert dupes[0][0] > 0.7
+
+    # 2 回目は変わった記事のみ計算する
+    (tmp_path / 'c.html').write_text(_article(base), encoding='utf8')
+    dupes = find_dupes(paths, threshold=0.5, cache_path=cache_path)
+    assert {(p1.name, p2.name) for _, p1, p2 in dupes} == {
+        ('a.html', 'b.html'), ('a.html', 'c.html'), ('b.html', 'c.html'),
+    }
@@ -0,0 +1,51 @@
+from cookies_site_utils.git_util import GitTimestamps
+from cookies_site_utils.builder import build_index, IndexPage
+from tests.test_builder import _make_site
+from datetime import datetime
+import subprocess
+import shutil
+import os
+import pytest
+
+
+def _git(root, *args):
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@example.com',
+        GIT_COMMITTER_NAME='a', GIT_COMMITTER_EMAIL='a@example.com',
+        GIT_AUTHOR_DATE='2020-01-02T00:00:00', GIT_COMMITTER_DATE='2020-01-02T00:00:00',
+    )
+    subprocess.run(['git', *args], cwd=root, env=env, check=True, capture_output=True)
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason='git がありません')
+def test_git_timestamps(tmp_path, monkeypatch):
+    site_root, template_root = _make_site(tmp_path, 2)
+    _git(tmp_path, 'init', '-q')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-q', '-m', 'init')
+    (site_root / 'articles' / 'a1.html').write_text(
+        (site_root / 'articles' / 'a1.html').read_text(encoding='utf8') + '\n',
+        encoding='utf8',
+    )  # 変更のあるファイルは更新時刻
+    cache_path = tmp_path / '.git_timestamps.json'
+
+    calls = []
+    run = subprocess.run
+    monkeypatch.setattr(
+        'cookies_site_utils.git_util.subprocess.run',
+        lambda args, **kwargs: calls.append(args) or run(args, **kwargs),
+    )
+    provider = GitTimestamps(site_root, cache_path)
+    with build_index(site_root, timestamp_provider=provider):
+        index_ = IndexPage(site_root, template_root, 'hoge')
+    timestamps = {a.rel_path: a.timestamp for a in index_.articles}
+    today = datetime.now().strftime('%Y-%m-%d')
+    assert timestamps == {'articles/a0.html': '2020-01-02', 'articles/a1.html': today}
+    assert index_.timestamp == today  # このビルドで書き込んだページ
+    assert len(calls) == 3  # rev-parse, status, log
+
+    # 同じ HEAD ならキャッシュを使う
+    calls.clear()
+    assert GitTimestamps(site_root, cache_path).dates == provider.dates
+    assert len(calls) == 2
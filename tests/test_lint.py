@@ -0,0 +1,30 @@
+from cookies_site_utils.lint import lint_site, format_results
+import json
+
+
+def test_lint_site(tmp_path):
+    (tmp_path / 'articles').mkdir()
+    (tmp_path / 'index.html').write_text(
+        '<title>hoge</title><h1>Hoge</h1>', encoding='utf8',
+    )
+    (tmp_path / 'articles' / 'a.html').write_text(
+        '<title>a - hoge</title><h1>a</h1>', encoding='utf8',
+    )
+    (tmp_path / 'articles' / 'b.html').write_text(
+        '<title>b</title><h1 style="x">b</h1><a target="_blank">x</a>',
+        encoding='utf8',
+    )
+    for jobs in [1, 2]:
+        results = lint_site(tmp_path, 'hoge', jobs=jobs)
+        assert [r['path'] for r in results] == [
+            'articles/a.html', 'articles/b.html', 'index.html',
+        ]
+        # 1 ファイルのすべての違反が集められる
+        assert results[1]['errors'] == [
+            'インラインスタイルがある',
+            'a タグに target 属性がある',
+            'title タグが h1 タグ + サブサイト名でない',
+        ]
+        assert results[0]['errors'] == results[2]['errors'] == []
+    assert len(json.loads(format_results(results, 'json'))) == 1
+    assert 'articles/b.html: インラインスタイルがある' in format_results(results)
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import os
+import pytest
+
+# サブコマンドごとの起動時インポートの予算 (python -X importtime の累積マイクロ秒)
+# と、そのサブコマンドで読み込まれてはならない重い依存
+# 時間は環境や負荷で揺れるので CSU_IMPORT_BUDGET=1 のときのみ予算と比べます
+# (読み込まれたモジュールは常に確かめます)
+CHECK_TIME = bool(os.environ.get('CSU_IMPORT_BUDGET'))
+HEAVY_MODULES = {'bs4', 'jinja2', 'shirotsubaki', 'toml'}
+BUDGETS = {
+    'sync_hash': (
+        'import cookies_site_utils.__main__',
+        300_000, HEAVY_MODULES,
+    ),
+    'article_helper': (
+        'import cookies_site_utils.__main__; '
+        'import cookies_site_utils.article_helper',
+        2_000_000, {'numpy'},
+    ),
+    'article_helper_worker': (  # ワーカーが起動していればこれだけで済む
+        'import cookies_site_utils.__main__; import cookies_site_utils.worker',
+        300_000, HEAVY_MODULES,
+    ),
+    'serve': (
+        'import cookies_site_utils.__main__; import cookies_site_utils.server',
+        500_000, HEAVY_MODULES,
+    ),
+    'dupes': (  # NumPy は MinHash を計算するときにだけインポートする
+        'import cookies_site_utils.__main__; import cookies_site_utils.dupes',
+        2_000_000, {'numpy'},
+    ),
+    'memdiff': (
+        'import cookies_site_utils.__main__; import cookies_site_utils.memprof',
+        300_000, HEAVY_MODULES,
+    ),
+    'lint': (
+        'import cookies_site_utils.__main__; import cookies_site_utils.lint',
+        2_000_000, {'numpy'},
+    ),
+}
+
+
+def _import_times(code):
+    """
+    python -X importtime の出力からトップレベルのインポート時間の合計と
+    読み込まれたモジュール名の集合を返します
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True,
+    )
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if not name[1:].startswith(' '):  # トップレベル
+            total += int(cumulative)
+    return total, modules
+
+
+@pytest.mark.parametrize('command', BUDGETS.keys())
+def test_startup_budget(command):
+    code, budget, forbidden = BUDGETS[command]
+    total, modules = _import_times(code)
+    print(f'{command}: {total / 1000:.1f} ms (budget {budget / 1000:.0f} ms)')
+    assert not (forbidden & {m.split('.')[0] for m in modules})
+    if CHECK_TIME:
+        assert total <= budget
@@ -0,0 +1,59 @@
+from cookies_site_utils.memprof import compare_reports, format_comparison
+from cookies_site_utils.builder import build_index, IndexPage, Sitemap
+from cookies_site_utils.article_helper import ArticleHelper
+from tests.test_builder import _make_site
+import tracemalloc
+import json
+
+
+def test_memory_report(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 3)
+    report_path = tmp_path / 'memory.json'
+    with build_index(site_root, memory_report_path=report_path):
+        index_ = IndexPage(site_root, template_root, 'hoge')
+        Sitemap(index_.get_pages())
+    assert not tracemalloc.is_tracing()
+    report = json.loads(report_path.read_text(encoding='utf8'))
+    names = [s['name'] for s in report['stages']]
+    assert names == [
+        'hoge/collect_articles', 'hoge/generate_categories', 'hoge/render_index',
+        'sitemap', 'finish',
+    ]
+    assert report['peak'] == max(s['peak'] for s in report['stages'])
+    for s in report['stages']:
+        assert s['peak'] >= 0 and len(s['top']) <= 10
+        for site in s['top']:  # 環境によらない相対パス
+            assert not site['site'].startswith('/') and site['size'] > 0
+
+    # 計測しないときは何も書かない
+    report_path.unlink()
+    with build_index(site_root):
+        IndexPage(site_root, template_root, 'hoge')
+    assert not report_path.exists()
+
+
+def test_compare_reports():
+    old = {'stages': [{'name': 'a', 'peak': 100}, {'name': 'b', 'peak': 100}]}
+    new = {'stages': [
+        {'name': 'a', 'peak': 105}, {'name': 'b', 'peak': 200}, {'name': 'c', 'peak': 1},
+    ]}
+    assert compare_reports(old, new, 0.1) == [('b', 100, 200)]
+    assert compare_reports(old, new, 1.0) == []
+    lines = format_comparison(old, new, 0.1).splitlines()
+    assert lines[1] == '! b 100 -> 200 (2.00x)'
+    assert lines[2] == '  c - -> 1 (-)'
+
+
+def test_helper_memory_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_site(tmp_path, 2)
+    conf_path = tmp_path / '.helper.toml'
+    conf_path.write_text(
+        'subsite_name = "hoge"\nsoupify_jobs = 1\nmemory_report_path = "memory.json"\n'
+        '[[job_groups]]\nskip = true\npaths = []\njobs = []\n'
+        '[[job_groups]]\npaths = ["docs/articles/*.html"]\n'
+        '[[job_groups.jobs]]\njob_type = "SOUPIFY"\n', encoding='utf8',
+    )
+    ArticleHelper.run_jobs(conf_path)
+    report = json.loads((tmp_path / 'memory.json').read_text(encoding='utf8'))
+    assert [s['name'] for s in report['stages']] == ['job_group/1', 'finish']
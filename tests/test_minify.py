@@ -0,0 +1,36 @@
+from cookies_site_utils.minify import minify_html, minify_css, minify_js, publish
+
+
+def test_minify_html():
+    html = '<div>\n<p>a <b>b</b>\n<i>c</i>  d</p>\n<pre>  x\n  y</pre>\n<!-- c -->\n</div>'
+    assert minify_html(html) == '<div><p>a <b>b</b> <i>c</i> d</p><pre>  x\n  y</pre></div>\n'
+    assert minify_html('<p><code>a  b</code> c</p>') == '<p><code>a  b</code> c</p>\n'
+
+
+def test_minify_css():
+    css = '/* x */\na > b,\nc {\n  color: red;\n  content: "a  ;  b";\n}\n'
+    assert minify_css(css) == 'a>b,c{color:red;content:"a  ;  b"}\n'
+
+
+def test_minify_js():
+    js = 'function f() {\n  // c\n\n  let s = `a\n  b`;\n  return s;\n}\n'
+    assert minify_js(js) == 'function f() {\nlet s = `a\n  b`;\nreturn s;\n}\n'
+
+
+def test_publish(tmp_path):
+    site_root = tmp_path / 'docs'
+    out_dir = tmp_path / 'out'
+    (site_root / 'css').mkdir(parents=True)
+    (site_root / 'index.html').write_text('<div>\n a\n</div>\n', encoding='utf8')
+    (site_root / 'css' / 'style.css').write_text('a {\n  b: c;\n}\n', encoding='utf8')
+    (site_root / 'x.png').write_bytes(b'\x00 \n')
+    assert publish(site_root, out_dir) == 3
+    assert (out_dir / 'index.html').read_text(encoding='utf8') == '<div>a</div>\n'
+    assert (out_dir / 'css' / 'style.css').read_text(encoding='utf8') == 'a{b:c}\n'
+    assert (out_dir / 'x.png').read_bytes() == b'\x00 \n'
+
+    # ソースが変わらないファイルは書き出さず、なくなったファイルは削除する
+    (site_root / 'index.html').write_text('<p>b</p>\n', encoding='utf8')
+    (site_root / 'x.png').unlink()
+    assert publish(site_root, out_dir) == 1
+    assert not (out_dir / 'x.png').exists()
@@ -0,0 +1,36 @@
+from cookies_site_utils.related import related_articles, write_related
+from cookies_site_utils.builder import build_index, IndexPage
+from tests.test_builder import _make_site
+import cookies_site_utils.related as related
+
+
+def test_related_articles():
+    memberships = {
+        'big': [('a', None), ('b', None), ('c', None), ('d', None)],
+        'small': [('a', 's'), ('c', 's'), ('d', 't')],
+    }
+    result = related_articles(memberships, ['a', 'b'], k=2)
+    assert [r for r, _ in result['a']] == ['c', 'd']
+    assert result['a'][0][1] > result['a'][1][1]  # 同じサブカテゴリ
+    assert [r for r, _ in result['b']] == ['a', 'c']
+
+
+def test_write_related(tmp_path, monkeypatch):
+    site_root, template_root = _make_site(tmp_path, 3)
+    with build_index(site_root):
+        index_ = IndexPage(site_root, template_root, 'hoge')
+    sidecar_path = site_root / 'related.json'
+    result = write_related(index_, sidecar_path, k=2)
+    assert [r for r, _ in result['articles/a0.html']] == [
+        'articles/a1.html', 'articles/a2.html',
+    ]
+
+    # 所属記事が変わらなければ計算し直さない
+    calls = []
+    original = related.related_articles
+    monkeypatch.setattr(
+        related, 'related_articles',
+        lambda m, targets, k: calls.append(set(targets)) or original(m, targets, k),
+    )
+    assert write_related(index_, sidecar_path, k=2) == result
+    assert calls == [set()]
@@ -0,0 +1,73 @@
+from cookies_site_utils.resources import (
+    JS_MODULES, js_module, modules_for, sync_bundles, sync_resource, use_bundle,
+)
+from cookies_site_utils.builder import build_index, IndexPage, Page
+from cookies_site_utils.core import File
+from cookies_site_utils.minify import publish
+from tests.test_builder import _make_site
+import pytest
+
+
+def test_sync_resource(tmp_path):
+    sync_resource(tmp_path / 'funcs.js')
+    text = (tmp_path / 'funcs.js').read_text(encoding='utf8')
+    for name in JS_MODULES:
+        assert js_module(name) in text
+    assert text.index('function createSidebar') < text.index('function init(')
+
+
+def test_modules_for():
+    assert modules_for({'div', '#sidebar'}) == ['sidebar', 'buttons', 'links', 'main']
+    assert 'refs' in modules_for({'div', '.ref'})
+    assert 'loader' in modules_for({'script', '[data-mathjax]'})
+
+
+def test_use_bundle():
+    text = '<script data-repo="a" id="app" src="../funcs.js?v=3"></script>'
+    assert use_bundle(text, 'article') == (
+        '<script data-repo="a" id="app" src="../funcs-article.js?v=3"></script>'
+    )
+
+
+def test_sync_bundles(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 2)
+    index_template = template_root / 'index_template.html'
+    index_template.write_text(index_template.read_text(encoding='utf8').replace(
+        '</body>', '<script id="app" src="funcs.js?v=1" data-repo="a"></script></body>',
+    ), encoding='utf8')
+    with pytest.raises(ValueError):  # バンドルのモジュールを選べない
+        with build_index(site_root, js_bundles=True):
+            pass
+    with build_index(site_root, collect_signatures=True, js_bundles=True):
+        IndexPage(site_root, template_root, 'hoge')
+    assert 'src="funcs-index.js?v=1"' in (site_root / 'index.html').read_text(encoding='utf8')
+    assert (site_root / 'funcs-index.js').is_file()  # 参照するページと同じビルドで書き出す
+
+    manifest_path = tmp_path / '.bundles.json'
+    (site_root / 'funcs-index.js').unlink()
+    File.start_check()  # チェックモードではバンドルもマニフェストも書かない
+    sync_bundles(site_root, Page.signatures, manifest_path)
+    assert ('A', 'funcs-index.js') in File.finish_check()
+    assert not manifest_path.exists() and not (site_root / 'funcs-index.js').exists()
+
+    sizes = sync_bundles(site_root, Page.signatures, manifest_path)
+    assert set(sizes) == {'article', 'category', 'index'}
+    assert sizes['index'][0] < sizes['index'][1]
+    bundle = (site_root / 'funcs-index.js').read_text(encoding='utf8')
+    assert 'function createSidebar' in bundle and 'function linkRefs' not in bundle
+
+    # 入力が変わらなければ書き直さない
+    mtime = (site_root / 'funcs-index.js').stat().st_mtime_ns
+    sync_bundles(site_root, Page.signatures, manifest_path)
+    assert (site_root / 'funcs-index.js').stat().st_mtime_ns == mtime
+
+    # 公開時に参照先のバンドルがなければ例外
+    publish(site_root, tmp_path / 'public', js_bundles=True)
+    (site_root / 'funcs-index.js').unlink()
+    (site_root / 'index.html').write_text(
+        (site_root / 'index.html').read_text(encoding='utf8').replace(
+            'funcs-index.js', 'funcs.js',
+        ), encoding='utf8',
+    )
+    with pytest.raises(ValueError, match='バンドルがありません'):
+        publish(site_root, tmp_path / 'public', js_bundles=True)
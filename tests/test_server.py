@@ -0,0 +1,81 @@
+from cookies_site_utils.server import SiteServer, ResponseCache
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from http.client import HTTPConnection
+import threading
+import gzip
+import pytest
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / 'articles').mkdir()
+    (tmp_path / 'index.html').write_text('<h1>あ</h1>' * 100, encoding='utf8')
+    (tmp_path / 'articles' / 'a.html').write_text('<h1>a</h1>', encoding='utf8')
+    server = SiteServer(('127.0.0.1', 0), tmp_path, max_workers=4)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_server(server):
+    server, url = server
+    with urlopen(url + '/') as res:
+        body = res.read()
+        etag = res.headers['ETag']
+        assert res.headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert body.decode('utf8') == '<h1>あ</h1>' * 100
+
+    with pytest.raises(HTTPError) as e:
+        urlopen(Request(url + '/index.html', headers={'If-None-Match': etag}))
+    assert e.value.code == 304
+
+    req = Request(url + '/index.html', headers={'Accept-Encoding': 'gzip'})
+    with urlopen(req) as res:
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert res.headers['ETag'] != etag
+        assert gzip.decompress(res.read()) == body
+
+    # 更新されたファイルはキャッシュを使わない
+    (server.site_root / 'articles' / 'a.html').write_text('<h1>bb</h1>', encoding='utf8')
+    with urlopen(url + '/articles/a.html') as res:
+        assert res.read() == b'<h1>bb</h1>'
+
+    # スラッシュのないディレクトリはスラッシュ付きにリダイレクトする
+    (server.site_root / 'sub').mkdir()
+    (server.site_root / 'sub' / 'index.html').write_text('<h1>s</h1>', encoding='utf8')
+    with urlopen(url + '/sub') as res:
+        assert res.url == url + '/sub/'
+        assert res.read() == b'<h1>s</h1>'
+    conn = HTTPConnection('127.0.0.1', server.server_port)
+    conn.request('GET', '/sub?x=1')
+    res = conn.getresponse()
+    assert res.status == 301 and res.headers['Location'] == '/sub/?x=1'
+    conn.close()
+
+    for path in ['/nothing.html', '/../x']:
+        with pytest.raises(HTTPError) as e:
+            urlopen(url + path)
+        assert e.value.code == 404
+
+
+def test_response_cache_gzip(tmp_path):
+    path = tmp_path / 'a.html'
+    path.write_text('<p>a</p>' * 1000, encoding='utf8')
+    cache = ResponseCache()
+    entry = cache.get(path)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        bodies = list(executor.map(lambda _: cache.get_gzip(path, entry), range(16)))
+    assert all(b is bodies[0] for b in bodies)
+    assert cache.n_bytes == len(entry['body']) + len(entry['gzip'])
+
+    # 追い出されたエントリの圧縮は数えない
+    path.write_text('<p>b</p>', encoding='utf8')
+    old = entry
+    entry = cache.get(path)
+    old['gzip'] = None
+    cache.get_gzip(path, old)
+    assert cache.n_bytes == len(entry['body'])
@@ -0,0 +1,72 @@
+from cookies_site_utils.builder import build_index, IndexPage, Page
+from cookies_site_utils.shard import build_sharded, shard_of
+from tests.test_builder import _make_site
+import json
+import pytest
+
+
+def test_build_sharded(tmp_path):
+    site_root, template_root = _make_site(tmp_path / 'a', 6)
+    last_counts_path = tmp_path / 'a' / '.last_counts.toml'
+    with build_index(site_root, last_counts_path=last_counts_path):
+        index_ = IndexPage(site_root, template_root, 'hoge')
+    expected = (site_root / 'index.html').read_text(encoding='utf8')
+    last_counts = last_counts_path.read_text(encoding='utf8')
+    (site_root / 'index.html').unlink()
+
+    with build_index(site_root, last_counts_path=last_counts_path):
+        index_sharded = build_sharded(site_root, template_root, 'hoge', 3)
+    assert (site_root / 'index.html').read_text(encoding='utf8') == expected
+    assert last_counts_path.read_text(encoding='utf8') == last_counts
+    assert (
+        [a.rel_path for a in index_sharded.articles]
+        == [a.rel_path for a in index_.articles]
+    )
+    assert len({shard_of(a.rel_path, 3) for a in index_.articles}) > 1
+
+
+def test_build_sharded_category_conflict(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 4)
+    path = site_root / 'articles' / 'a3.html'
+    path.write_text(
+        path.read_text(encoding='utf8').replace('>c</a>', '>cc</a>'),
+        encoding='utf8',
+    )
+    with pytest.raises(ValueError, match='カテゴリ名のゆれ'):
+        with build_index(site_root):
+            build_sharded(site_root, template_root, 'hoge', 2)
+
+
+def test_build_sharded_keep_going(tmp_path):
+    site_root, template_root = _make_site(tmp_path, 4)
+    path = site_root / 'articles' / 'a3.html'
+    path.write_text(
+        path.read_text(encoding='utf8').replace('<h1>a3</h1>', ''), encoding='utf8',
+    )
+    checkpoint_path = tmp_path / '.checkpoint.json'
+    work_dir = tmp_path / 'work'
+    with pytest.raises(SystemExit):
+        with build_index(
+            site_root, keep_going=True, collect_signatures=True,
+            checkpoint_path=checkpoint_path,
+        ):
+            index_ = build_sharded(site_root, template_root, 'hoge', 2, work_dir)
+    assert len(Page.errors) == 1 and 'a3.html' in Page.errors[0]
+    assert len(index_.articles) == 3
+    assert {'.item', '.categories', 'h1'} <= Page.signatures['article']
+    assert sorted(json.loads(checkpoint_path.read_text(encoding='utf8'))) == [
+        'articles/a0.html', 'articles/a1.html', 'articles/a2.html',
+    ]
+    assert sorted(p.name for p in work_dir.iterdir()) == ['shard-0.json', 'shard-1.json']
+
+    # チェックポイントにある記事ページはシャードに渡さずシグネチャを復元する
+    path.unlink()
+    with build_index(
+        site_root, keep_going=True, collect_signatures=True,
+        checkpoint_path=checkpoint_path,
+    ):
+        index_ = build_sharded(site_root, template_root, 'hoge', 2, work_dir)
+    assert len(index_.articles) == 3
+    assert {'.item', '.categories', 'h1'} <= Page.signatures['article']
+    for manifest_path in work_dir.iterdir():
+        assert json.loads(manifest_path.read_text(encoding='utf8'))['articles'] == []
@@ -214,6 +214,18 @@ def test_add_references_with_key(monkeypatch):
     assert soup.find_all('a')[1]['href'] == 'iiii'
 
 
+def test_add_references_with_key_dedup():
+    soup = BeautifulSoup('<div class="item"></div>', 'html.parser')
+    su.add_references_with_key(soup, [
+        {'key': 'a', 'title': 'あああ', 'urls': ['aaa']},
+        {'key': 'b', 'title': 'いいい', 'urls': ['aaa']},  # URL が既出
+        {'key': ' ', 'title': 'ううう', 'urls': ['uuu']},  # キーが空
+    ])
+    assert [dt.get_text() for dt in soup.find_all('dt')] == ['a']
+    su.add_references_with_key(soup, [{'key': 'c', 'title': 'えええ', 'urls': ['aaa']}])
+    assert [dt.get_text() for dt in soup.find_all('dt')] == ['a']
+
+
 def test_add_categories():
     html = '''
     <div class="item">
@@ -278,3 +290,34 @@ def test_clear_item():
     assert len(refs) == 0
     cats = soup.find('div', class_='categories').find_all('a')
     assert len(cats) == 0
+
+
+def test_prerender_sidebar():
+    html = '''
+    <html><head>
+    <script data-repo="a" defer="true" id="app" src="../funcs.js"></script>
+    </head><body>
+    <div class="container"><div id="sidebar"></div><main class="main">
+    <div id="smartphone-header"></div><div class="item"><h1>あああ</h1>
+    <h2>いいい</h2><h3>ううう</h3>
+    </div></main></div></body></html>
+    '''
+    soup = BeautifulSoup(html.replace('    ', ''), 'html.parser')
+    assert su.prerender_sidebar(soup)
+    sidebar = soup.find(id='sidebar')
+    assert sidebar['data-prerendered'] == 'true'
+    assert sidebar.find('h2', class_='logo') is not None
+    assert 'CookieBox26/a/issues' in str(sidebar)
+    links = sidebar.find(id='headers').find_all('a')
+    assert [(a['href'], a.get_text()) for a in links] == [
+        ('#head0', 'いいい'), ('#head1', 'ううう'),
+    ]
+    assert soup.find('h3').find('a')['id'] == 'head1'
+    assert soup.find(id='smartphone-header').find(id='mode-light-0') is not None
+
+    # 再描画しても重複しない
+    decoded = str(soup)
+    assert su.prerender_sidebar(soup)
+    assert str(soup) == decoded
+    su.clear_prerendered(soup)
+    assert str(soup) == html.replace('    ', '')
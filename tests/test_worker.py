@@ -0,0 +1,140 @@
+from cookies_site_utils.article_helper import ArticleHelper
+from cookies_site_utils.worker import (
+    serve_worker, stop_worker, run_in_worker, default_socket_path,
+)
+from pathlib import Path
+import threading
+import socket
+import tempfile
+import os
+import pytest
+import toml
+import time
+
+
+def test_worker(tmp_path, monkeypatch):
+    sock_path = tmp_path / 'w.sock'
+    conf_path = tmp_path / '.helper.toml'
+    conf_path.write_text('''
+    subsite_name = "hoge"
+
+    [[job_groups]]
+    paths = ["tests/docs/articles/fuga.html"]
+    [[job_groups.jobs]]
+    job_type = "SOUPIFY"
+    '''.replace('    ', ''), newline='\n', encoding='utf8')
+    assert not run_in_worker(conf_path, sock_path)  # 起動していなければ False
+
+    thread = threading.Thread(target=serve_worker, args=(sock_path,))
+    thread.start()
+    try:
+        while not sock_path.exists():
+            time.sleep(0.01)
+        commands = []
+        parsed = []
+        loads = toml.loads
+        monkeypatch.setattr(
+            'cookies_site_utils.article_helper.toml.loads',
+            lambda text: parsed.append(text) or loads(text),
+        )
+        monkeypatch.setattr(
+            'cookies_site_utils.worker.run_commands', commands.append,
+        )
+        assert run_in_worker(conf_path, sock_path)
+        assert run_in_worker(conf_path, sock_path)
+        assert commands[0] == [(True, ['git', 'status'])]
+        assert len(parsed) == 1  # 設定は 1 回だけパースする
+        assert conf_path in ArticleHelper.conf_cache
+    finally:
+        stop_worker(sock_path)
+        thread.join()
+    assert not sock_path.exists()
+    assert Path.cwd() == Path(__file__).resolve().parent.parent
+
+
+def test_worker_prompt(tmp_path, monkeypatch):
+    from tests.test_article_helper import _write_article
+    sock_path = tmp_path / 'w.sock'
+    article = tmp_path / 'a.html'
+    _write_article(article, [('c', 'C')])
+    conf_path = tmp_path / '.helper.toml'
+
+    def write_conf(title):
+        conf_path.write_text(
+            f'[[job_groups]]\npaths = ["{article.as_posix()}"]\n'
+            '[[job_groups.jobs]]\njob_type = "ADD_REFERENCES_WITH_KEY"\n'
+            f'references = [{{key = "k", title = "{title}", urls = ["u"]}}]\n',
+            encoding='utf8',
+        )
+
+    thread = threading.Thread(target=serve_worker, args=(sock_path,))
+    thread.start()
+    try:
+        while not sock_path.exists():
+            time.sleep(0.01)
+        monkeypatch.setattr('cookies_site_utils.worker.run_commands', lambda c: None)
+        prompts = []
+        monkeypatch.setattr('builtins.input', lambda p: prompts.append(p) or 'y')
+        write_conf('あああ')
+        assert run_in_worker(conf_path, sock_path)
+        assert prompts == []
+        # 上書きの確認はクライアントで入力する
+        write_conf('いいい')
+        assert run_in_worker(conf_path, sock_path)
+        assert prompts == ['Overwrite? [y/N]: ']
+        text = article.read_text(encoding='utf8')
+        assert 'いいい' in text and 'あああ' not in text
+    finally:
+        stop_worker(sock_path)
+        thread.join()
+
+
+def test_socket_permissions(tmp_path, monkeypatch):
+    monkeypatch.delenv('CSU_WORKER_SOCKET', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    sock_path = default_socket_path()
+    assert sock_path.parent.stat().st_mode & 0o777 == 0o700
+    sock_path.parent.chmod(0o755)  # 他のユーザも書けるディレクトリは使わない
+    with pytest.raises(SystemExit):
+        default_socket_path()
+
+    # 他のユーザも接続できるソケットには接続しない (その場で実行する)
+    fake = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    fake.bind(str(tmp_path / 'w.sock'))
+    fake.listen()
+    os.chmod(tmp_path / 'w.sock', 0o666)
+    try:
+        assert not run_in_worker(tmp_path / '.helper.toml', tmp_path / 'w.sock')
+    finally:
+        fake.close()
+
+
+def test_worker_client_disconnect(tmp_path):
+    from tests.test_article_helper import _write_article
+    sock_path = tmp_path / 'w.sock'
+    article = tmp_path / 'a.html'
+    _write_article(article, [('c', 'C')])
+    conf_path = tmp_path / '.helper.toml'
+    conf_path.write_text(
+        f'[[job_groups]]\npaths = ["{article.as_posix()}"]\n'
+        '[[job_groups.jobs]]\njob_type = "SOUPIFY"\n', encoding='utf8',
+    )
+    thread = threading.Thread(target=serve_worker, args=(sock_path,))
+    thread.start()
+    try:
+        while not sock_path.exists():
+            time.sleep(0.01)
+        # 応答を待たずに切断するクライアントがいてもワーカーは止まらない
+        for _ in range(3):
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(str(sock_path))
+            conn.sendall(
+                f'{{"conf_path": "{conf_path.as_posix()}", "cwd": "{tmp_path.as_posix()}"}}\n'
+                .encode('utf8')
+            )
+            conn.close()
+        assert run_in_worker(conf_path, sock_path)
+    finally:
+        stop_worker(sock_path)
+        thread.join()